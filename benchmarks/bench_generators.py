@@ -0,0 +1,190 @@
+"""
+Script Name: Security Group Generators Benchmark
+
+Author: Pedro Romão
+
+Description:
+Generates synthetic security_groups.csv, security_rules.csv and security_group_rules.json files of a
+configurable size, runs sg_block.py and sg_rules.py against them and reports, as JSON, the wall time and
+peak RSS of each generator plus the time spent in each phase (load, normalize, match, render, write) and
+the counters (rows, matches, misses, ...) of its sg_profile.Profiler.
+
+Each generator runs in a separate process, with its default options and a Profiler, so the peak RSS
+is that generator's own and the phases and counters are those of the run that was timed. This process
+never imports pandas or the generators.
+
+Usage: python benchmarks/bench_generators.py --groups 2000 --rules-per-group 30 --output bench.json
+
+Date Created: 19/10/2024
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+DEFAULT_PROTOCOL_MIX = "tcp=60,udp=20,icmp=5,-1=15"
+DEFAULT_ADDRESS_MIX = "cidr=60,sg=30,pl=10"
+RULE_COLUMNS = ["GroupName", "GroupId", "Type", "IpProtocol", "FromPort", "ToPort",
+                "IpRanges", "UserIdGroupPairs", "PrefixListIds"]
+GROUP_COLUMNS = ["GroupName", "GroupId", "VpcId", "Description", "Tags"]
+
+def parse_mix(mix):
+    """Parses "name=weight,..." into a (names, weights) pair for random.choices."""
+    pairs = [item.split("=", 1) for item in mix.split(",")]
+    return [name.strip() for name, _ in pairs], [float(weight) for _, weight in pairs]
+
+def generate_dataset(directory, groups, rules_per_group, protocol_mix=DEFAULT_PROTOCOL_MIX,
+                     address_mix=DEFAULT_ADDRESS_MIX, description_collisions=0.05, seed=0):
+    """Writes the three input files of the generators into directory.
+
+    description_collisions is the fraction of rules repeated with the same address and description
+    within their group, which produces duplicate CSV rows and JSON rules with identical match keys.
+    """
+    rng = random.Random(seed)
+    protocols, protocol_weights = parse_mix(protocol_mix)
+    address_kinds, address_weights = parse_mix(address_mix)
+    rule_number = 0
+
+    with open(os.path.join(directory, "security_groups.csv"), "w", newline="") as groups_file, \
+            open(os.path.join(directory, "security_rules.csv"), "w", newline="") as rules_file, \
+            open(os.path.join(directory, "security_group_rules.json"), "w") as json_file:
+        group_writer = csv.DictWriter(groups_file, GROUP_COLUMNS)
+        rule_writer = csv.DictWriter(rules_file, RULE_COLUMNS)
+        group_writer.writeheader()
+        rule_writer.writeheader()
+        json_file.write('{\n    "SecurityGroupRules": [')
+
+        for group in range(groups):
+            group_id = f"sg-{group:017x}"
+            group_name = f"Synthetic Group {group}"
+            group_writer.writerow({
+                "GroupName": group_name,
+                "GroupId": group_id,
+                "VpcId": f"vpc-{group % 50:017x}",
+                "Description": f"Synthetic security group {group}",
+                "Tags": f"Name: {group_name}, Team: team{group % 10}" if group % 3 else "",
+            })
+
+            previous = None
+            for _ in range(rules_per_group):
+                if previous and rng.random() < description_collisions:
+                    row, rule = previous
+                else:
+                    is_egress = rng.random() < 0.3
+                    protocol = rng.choices(protocols, protocol_weights)[0]
+                    port = None if protocol == "-1" else rng.choice([22, 80, 443, 3306, 5432, 8080])
+                    address_kind = rng.choices(address_kinds, address_weights)[0]
+                    description = f"rule {rng.randrange(rules_per_group)}"
+
+                    row = dict.fromkeys(RULE_COLUMNS, "")
+                    row.update(GroupName=group_name, GroupId=group_id, Type="Outbound" if is_egress else "Inbound",
+                               IpProtocol=protocol, FromPort=port if port else "", ToPort=port if port else "")
+                    rule = {"GroupId": group_id, "GroupOwnerId": "123456789012", "IsEgress": is_egress,
+                            "IpProtocol": protocol, "FromPort": port or -1, "ToPort": port or -1,
+                            "Description": description, "Tags": []}
+
+                    if address_kind == "sg":
+                        address = f"sg-{rng.randrange(groups):017x}"
+                        row["UserIdGroupPairs"] = f"{address} ({description})"
+                        rule["ReferencedGroupInfo"] = {"GroupId": address, "UserId": "123456789012"}
+                    elif address_kind == "pl":
+                        address = f"pl-{rng.randrange(20):017x}"
+                        row["PrefixListIds"] = f"{address} ({description})"
+                        rule["PrefixListId"] = address
+                    else:
+                        address = f"10.{rng.randrange(256)}.{rng.randrange(256)}.0/24"
+                        row["IpRanges"] = f"{address} ({description})"
+                        rule["CidrIpv4"] = address
+                    previous = row, rule
+
+                rule_number += 1
+                rule_writer.writerow(row)
+                json_file.write("," if rule_number > 1 else "")
+                json_file.write("\n        " + json.dumps(dict(rule, SecurityGroupRuleId=f"sgr-{rule_number:017x}")))
+
+        json_file.write("\n    ]\n}\n")
+
+    return {"groups": groups, "rules": rule_number}
+
+# File the child process writes its profiler phases and counters to, in the dataset directory
+PROFILE_FILE = "bench_profile.json"
+
+def run_generator(code, directory):
+    """Runs a generator in a child process and returns its wall time, peak RSS in bytes, phases and counters.
+
+    code calls the generator with profiler=profiler, an sg_profile.Profiler set up by the child.
+    """
+    command = [sys.executable, "-c", (
+        f"import json, sys; sys.path.insert(0, {REPO_DIR!r}); from sg_profile import Profiler; "
+        f"profiler = Profiler(); {code}; "
+        f"json.dump({{'phases': profiler.seconds, 'counters': profiler.counters}}, open({PROFILE_FILE!r}, 'w'))"
+    )]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=directory, stdout=subprocess.DEVNULL)
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    else:
+        process.wait()
+        peak_rss = None
+    wall_seconds = time.perf_counter() - start
+
+    if process.returncode:
+        raise RuntimeError(f"Generator failed with exit code {process.returncode}: {code}")
+    with open(os.path.join(directory, PROFILE_FILE)) as file:
+        profile = json.load(file)
+    return {"wall_seconds": wall_seconds, "peak_rss_bytes": peak_rss, **profile}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sg_block.py and sg_rules.py on synthetic data.")
+    parser.add_argument("--groups", type=int, default=500)
+    parser.add_argument("--rules-per-group", type=int, default=20)
+    parser.add_argument("--protocol-mix", default=DEFAULT_PROTOCOL_MIX)
+    parser.add_argument("--address-mix", default=DEFAULT_ADDRESS_MIX)
+    parser.add_argument("--description-collisions", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Directory for the dataset and outputs (default: a temporary one)")
+    parser.add_argument("--output", help="File to write the JSON report to (default: stdout)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        directory = args.workdir or temporary_directory
+        os.makedirs(directory, exist_ok=True)
+
+        start = time.perf_counter()
+        dataset = generate_dataset(directory, args.groups, args.rules_per_group, args.protocol_mix,
+                                   args.address_mix, args.description_collisions, args.seed)
+        dataset.update(vars(args), generate_seconds=time.perf_counter() - start)
+
+        report = {
+            "dataset": dataset,
+            "sg_block": run_generator(
+                "import sg_block; sg_block.generate_security_group_from_csv("
+                "'security_groups.csv', 'terraform_security_groups.txt', profiler=profiler)", directory),
+            "sg_rules": run_generator(
+                "import sg_rules; sg_rules.generate_terraform_and_imports('security_rules.csv', "
+                "'security_group_rules.json', 'terraform_security_rules.txt', 'terraform_import_script.bat', "
+                "profiler=profiler)",
+                directory),
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Script Name: Terraform Renderer Benchmark
+
+Author: Pedro Romão
+
+Description:
+Measures the throughput, in blocks per second, of the sg_render templates against the previous
+f-string concatenation code for security group and rule blocks, and checks both produce the same text.
+
+Usage: python benchmarks/bench_render.py [number_of_blocks]
+
+Date Created: 19/10/2024
+"""
+
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sg_render import EGRESS_RULE_TYPE, INGRESS_RULE_TYPE, render_rule_block, render_security_group_block
+
+def concat_security_group_block(resource_name, group_name, description, vpc_id, tags_dict):
+    """Previous sg_block.py rendering, kept as the benchmark baseline."""
+    terraform_txt = f"""
+resource "aws_security_group" "{resource_name}" {{
+  name        = "{group_name}"
+  description = "{description}"
+  vpc_id      = "{vpc_id}"
+"""
+    if tags_dict:
+        terraform_txt += "  tags = {\n"
+        for key, value in tags_dict.items():
+            terraform_txt += f'    {key} = "{value}"\n'
+        terraform_txt += "  }\n"
+    terraform_txt += "}\n"
+    return terraform_txt
+
+def concat_rule_block(resource_type, rule_name, terraform_block):
+    """Previous sg_rules.py rendering, kept as the benchmark baseline."""
+    from_port = terraform_block["from_port"]
+    to_port = terraform_block["to_port"]
+    terraform_txt = f"""
+resource "{resource_type}" "{rule_name}" {{
+  security_group_id = "{terraform_block['rule_id']}"
+  ip_protocol = "{terraform_block['ip_protocol']}"
+"""
+    if from_port is not None and from_port != -1:
+        terraform_txt += f'  from_port = {from_port}\n'
+    if to_port is not None and to_port != -1:
+        terraform_txt += f'  to_port = {to_port}\n'
+    for key in ["cidr_ipv4", "referenced_security_group_id", "prefix_list_id"]:
+        if key in terraform_block:
+            terraform_txt += f'  {key} = "{terraform_block[key]}"\n'
+    if terraform_block["description"]:
+        terraform_txt += f'  description = "{terraform_block["description"]}"\n'
+    terraform_txt += "}\n"
+    return terraform_txt
+
+def synthetic_inputs(count):
+    """Builds count security group and rule render arguments with a mix of optional attributes."""
+    groups = []
+    rules = []
+    for i in range(count):
+        tags_dict = {f"tag{t}": f"value{t}" for t in range(i % 4)}
+        groups.append((f"group-{i}", f"group-{i}", f"Security group {i}", f"vpc-{i % 7}", tags_dict))
+
+        terraform_block = {
+            "rule_id": f"sg-{i:08x}",
+            "description": "Web traffic" if i % 2 else "",
+            "ip_protocol": "-1" if i % 5 == 0 else "tcp",
+            "from_port": None if i % 5 == 0 else 443,
+            "to_port": None if i % 5 == 0 else 443,
+        }
+        address_key = ("cidr_ipv4", "referenced_security_group_id", "prefix_list_id")[i % 3]
+        terraform_block[address_key] = "10.0.0.0/8"
+        resource_type = EGRESS_RULE_TYPE if i % 2 else INGRESS_RULE_TYPE
+        rules.append((resource_type, f"group-{i}-ingress1", terraform_block))
+    return groups, rules
+
+def blocks_per_second(render, arguments, repeat=7):
+    """Renders every argument tuple repeat times and returns the best throughput and the rendered blocks."""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        blocks = [render(*args) for args in arguments]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(arguments) / best, blocks
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    groups, rules = synthetic_inputs(count)
+
+    for label, arguments, baseline, renderer in [
+        ("aws_security_group", groups, concat_security_group_block, render_security_group_block),
+        ("security group rules", rules, concat_rule_block, render_rule_block),
+    ]:
+        baseline_rate, baseline_blocks = blocks_per_second(baseline, arguments)
+        renderer_rate, renderer_blocks = blocks_per_second(renderer, arguments)
+        if baseline_blocks != renderer_blocks:
+            raise SystemExit(f"Rendered {label} blocks differ from the baseline")
+
+        print(f"{label}: f-string concatenation {baseline_rate:,.0f} blocks/sec, "
+              f"sg_render {renderer_rate:,.0f} blocks/sec ({renderer_rate / baseline_rate:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Script Name: Parquet and Arrow Input
+
+Author: Pedro Romão
+
+Description:
+Reads the security group exports from Parquet files or Arrow IPC (Feather) files instead of CSV. Only the
+columns used by the generators are read, Arrow IPC files are memory-mapped, and the result is handed to the
+generators as pandas DataFrames with the same column names as the CSV exports. Requires pyarrow.
+
+Date Created: 19/10/2024
+"""
+
+import os
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+def is_arrow_input(path):
+    """Tells whether path is a Parquet or Arrow IPC file, from its extension."""
+    return os.path.splitext(str(path))[1].lower() in PARQUET_SUFFIXES + ARROW_SUFFIXES
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as error:
+        raise ImportError("Reading Parquet or Arrow input needs pyarrow (pip install pyarrow)") from error
+    return pyarrow
+
+def table_batches(table, chunk_size):
+    """Splits an Arrow table into record batches of at most chunk_size rows, or one batch if None."""
+    if chunk_size is None:
+        return [table]
+    return table.to_batches(max_chunksize=chunk_size)
+
+def iter_arrow_batches(path, columns, chunk_size=None):
+    """Yields Arrow tables or record batches holding only columns, chunk_size rows at a time."""
+    pyarrow = import_pyarrow()
+
+    if os.path.splitext(str(path))[1].lower() in PARQUET_SUFFIXES:
+        import pyarrow.parquet
+
+        parquet_file = pyarrow.parquet.ParquetFile(path, memory_map=True)
+        if chunk_size is None:
+            yield parquet_file.read(columns=columns)
+        else:
+            yield from parquet_file.iter_batches(batch_size=chunk_size, columns=columns)
+        return
+
+    # Arrow IPC, in the file (Feather v2) or the stream format, read straight from the memory map
+    with pyarrow.memory_map(str(path)) as source:
+        try:
+            table = pyarrow.ipc.open_file(source).read_all()
+        except pyarrow.ArrowInvalid:
+            source.seek(0)
+            table = pyarrow.ipc.open_stream(source).read_all()
+        yield from table_batches(table.select(columns), chunk_size)
+
+def read_arrow_frames(path, columns, chunk_size=None):
+    """Yields the Parquet or Arrow file as pandas DataFrames of chunk_size rows (a single one if None).
+
+    Nulls and empty strings become NaN like the missing cells of a CSV, and the row index
+    continues across chunks.
+    """
+    from pandas.api.types import is_string_dtype
+
+    first_index = 0
+    for batch in iter_arrow_batches(path, columns, chunk_size):
+        frame = batch.to_pandas()
+        for column in frame.columns:
+            values = frame[column]
+            if is_string_dtype(values):
+                frame[column] = values.mask(values.isna() | (values == ""))
+        frame.index = range(first_index, first_index + len(frame))
+        first_index += len(frame)
+        yield frame
@@ -10,61 +10,169 @@ It processes CSV and JSON files to create Terraform blocks, ensuring proper stru
 Date Created: 19/10/2024
 """
 
-import pandas as pd
+from sg_arrow import is_arrow_input, read_arrow_frames
+from sg_csv import ENGINES, choose_engine, is_missing, read_csv_rows
+from sg_incremental import IncrementalState, digest_rows
+from sg_output import BlockWriter, DEFAULT_BUFFER_SIZE, ShardedWriter
+from sg_profile import NULL_PROFILER, Profiler
+from sg_render import render_security_group_block
+
+# CSV columns read by the generator, all as text
+GROUP_COLUMNS = ["GroupName", "VpcId", "Description", "Tags"]
+# Output sharding of output_dir: one file per security group or per VPC
+SPLIT_BY = ("group", "vpc")
 
 # Function to convert tags from the CSV format into a dictionary
 def parse_tags(tags_string):
     tags_dict = {}
-    if pd.notna(tags_string):
+    if not is_missing(tags_string):
         tags_pairs = tags_string.split(',')
         for pair in tags_pairs:
             key, value = pair.split(':', 1)  # Split only on the first colon
             tags_dict[key.strip()] = value.strip()  # Add to dictionary
     return tags_dict
 
-# Load the CSV file
-def generate_security_group_from_csv(csv_file, output_file):
-    df = pd.read_csv(csv_file)
-
-    terraform_blocks = []
-
-    # Loop through each row in the DataFrame
-    for index, row in df.iterrows():
-        group_name = row['GroupName'].replace(" ", "-").lower()  # Replace spaces in group name
-        vpc_id = row['VpcId']  # VPC ID
-        description = row['Description']  # Description
-        tags_string = row['Tags']  # Tags string
-
-        # Use the group name directly for the resource name (without '-sg')
-        resource_name = group_name
-
-        # Parse the tags into a dictionary
-        tags_dict = parse_tags(tags_string)
-
-        # Start building the Terraform block
-        terraform_txt = f"""
-resource "aws_security_group" "{resource_name}" {{
-  name        = "{group_name}"
-  description = "{description}"
-  vpc_id      = "{vpc_id}"
-"""
-
-        # Add tags block only if there are tags
-        if tags_dict:
-            terraform_txt += "  tags = {\n"
-            for key, value in tags_dict.items():
-                terraform_txt += f'    {key} = "{value}"\n'
-            terraform_txt += "  }\n"
+def select_reused_groups(rows, state):
+    """Incremental mode: records the digest of every group's rows and returns the blocks of the unchanged ones.
 
-        terraform_txt += "}\n"
+    Returns a dict of group name to an iterator over the blocks rendered for it by the previous run.
+    """
+    rows_by_group = {}
+    for row in rows:
+        rows_by_group.setdefault(row['GroupName'], []).append(row)
 
-        terraform_blocks.append(terraform_txt)
+    reused = {}
+    for group, group_rows in rows_by_group.items():
+        digest = digest_rows(tuple(row[column] for column in GROUP_COLUMNS) for row in group_rows)
+        if not state.update(group, digest):
+            reused[group] = iter(state.reuse(group))
+    return reused
 
-    # Write the Terraform blocks to a text file
-    with open(output_file, 'w') as file:
-        file.writelines(terraform_blocks)
-
-# Fill with your file names
-csv_file = "security_groups.csv"  # Path to your CSV file
-output_file = "terraform_security_groups.txt"  # Output file for Terraform blocks
-generate_security_group_from_csv(csv_file, output_file)
+# Load the CSV file
+def generate_security_group_from_csv(csv_file, output_file, buffer_size=DEFAULT_BUFFER_SIZE, profiler=NULL_PROFILER,
+                                     engine="auto", incremental_state=None, output_dir=None, split_by="group"):
+    """Generates the security group blocks of the CSV file into output_file.
+
+    With incremental_state, the blocks of each group are kept in that file with a digest of its
+    rows, and the next run only renders the groups whose rows changed (see sg_incremental).
+    With output_dir, the blocks go to one "<group>.security_group.tf" file per security group,
+    or per VPC with split_by="vpc", in that directory instead of output_file.
+    """
+    if split_by not in SPLIT_BY:
+        raise ValueError(f"Unknown split_by {split_by!r}, expected one of {', '.join(SPLIT_BY)}")
+    profiler.lap()
+    engine = choose_engine(csv_file, engine)
+    if engine != "stdlib":
+        import pandas as pd
+
+        if is_arrow_input(csv_file):
+            df = next(read_arrow_frames(csv_file, GROUP_COLUMNS))
+        elif engine == "pyarrow":
+            df = pd.read_csv(csv_file, usecols=GROUP_COLUMNS, dtype=str, engine="pyarrow")
+        else:
+            df = pd.read_csv(csv_file, usecols=GROUP_COLUMNS, dtype=str, memory_map=True)
+        rows = (row for _, row in df.iterrows())
+        row_count = len(df)
+    else:
+        # Same cells as pandas, read with the csv module
+        rows = next(read_csv_rows(csv_file))
+        row_count = len(rows)
+    profiler.count("CSV rows", row_count)
+    profiler.lap("load")
+
+    state = None
+    reused = {}
+    if incremental_state:
+        state = IncrementalState(incremental_state, "sg_block")
+        rows = list(rows)
+        reused = select_reused_groups(rows, state)
+        profiler.lap("normalize")
+
+    # Write each Terraform block to the text file as soon as it is built, or to its shard file
+    if output_dir:
+        block_writer = ShardedWriter(output_dir, "security_group")
+    else:
+        block_writer = BlockWriter(output_file, buffer_size=buffer_size)
+
+    # Loop through each row of the CSV
+    for row in rows:
+        if row['GroupName'] in reused:
+            # Unchanged since the run that wrote the incremental state
+            terraform_txt = next(reused[row['GroupName']])
+        else:
+            group_name = row['GroupName'].replace(" ", "-").lower()  # Replace spaces in group name
+            vpc_id = row['VpcId']  # VPC ID
+            description = row['Description']  # Description
+            tags_string = row['Tags']  # Tags string
+
+            # Use the group name directly for the resource name (without '-sg')
+            resource_name = group_name
+
+            # Parse the tags into a dictionary
+            tags_dict = parse_tags(tags_string)
+            profiler.lap("normalize")
+
+            # Render the Terraform block, with a tags block only if there are tags
+            terraform_txt = render_security_group_block(resource_name, group_name, description, vpc_id, tags_dict)
+            profiler.lap("render")
+
+        if split_by == "vpc":
+            shard = "no-vpc" if is_missing(row['VpcId']) else row['VpcId']
+        else:
+            shard = row['GroupName'].replace(" ", "-").lower()
+        block_writer.write(terraform_txt, shard)
+        if state is not None:
+            state.add(row['GroupName'], terraform_txt)
+        profiler.lap("write")
+
+    block_writer.close()
+    if output_dir:
+        print(block_writer.summary())
+    if state is not None:
+        state.save()
+        print(state.report())
+    profiler.lap("write")
+    if profiler.enabled:
+        print(profiler.finish())
+
+def generate_security_groups(csv_file="security_groups.csv", output_file="terraform_security_groups.txt", **options):
+    """Library entry point: generates the security group blocks, with the usual file names by default.
+
+    options are passed on to generate_security_group_from_csv (buffer_size, profiler, engine, incremental_state,
+    output_dir, split_by).
+    """
+    generate_security_group_from_csv(csv_file, output_file, **options)
+
+def main(argv=None):
+    """Command line entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generates Terraform security group blocks.")
+    parser.add_argument("--csv", default="security_groups.csv",
+                        help="Security groups CSV export, or a .parquet/.arrow/.feather file")
+    parser.add_argument("--output", default="terraform_security_groups.txt", help="Terraform blocks output file")
+    parser.add_argument("--output-dir", help="Write one .security_group.tf file per shard here instead of --output")
+    parser.add_argument("--split-by", choices=SPLIT_BY, default="group",
+                        help="Shard the --output-dir files per security group or per VPC")
+    parser.add_argument("--engine", choices=ENGINES, default="auto",
+                        help="CSV reader: pandas, pyarrow, stdlib (csv module) or auto (stdlib unless pandas "
+                             "is needed)")
+    parser.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE, help="Output buffer size in bytes")
+    parser.add_argument("--incremental", metavar="STATE_FILE",
+                        help="Only render the security groups changed since the run that wrote STATE_FILE")
+    parser.add_argument("--profile", action="store_true", help="Print per-phase timings and counters")
+    parser.add_argument("--cprofile", metavar="FILE", help="Also dump cProfile stats to FILE (implies --profile)")
+    args = parser.parse_args(argv)
+
+    generate_security_groups(
+        args.csv, args.output,
+        buffer_size=args.buffer_size,
+        engine=args.engine,
+        incremental_state=args.incremental,
+        output_dir=args.output_dir,
+        split_by=args.split_by,
+        profiler=Profiler(args.cprofile) if args.profile or args.cprofile else NULL_PROFILER
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Script Name: JSON Rule Index Cache
+
+Author: Pedro Romão
+
+Description:
+Keeps data built from an input file, such as the parsed JSON rules and their match index, in a pickle file,
+so later runs against the same input skip parsing and indexing. The cache records the path, size,
+modification time and SHA-256 of the input and is rebuilt as soon as the input content changes.
+Cache files are trusted pickles, only load caches written by these scripts.
+
+Date Created: 19/10/2024
+"""
+
+import gc
+import hashlib
+import os
+import pickle
+
+# Bump when the cached objects change shape, older caches are then rebuilt
+CACHE_FORMAT = 2
+PICKLE_PROTOCOL = 5
+
+def file_digest(path, chunk_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file, read chunk_size bytes at a time."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_key(source_file, digest=None):
+    """Describes the current state of source_file, the cache is valid while this stays the same."""
+    stat = os.stat(source_file)
+    return {
+        "format": CACHE_FORMAT,
+        "path": os.path.abspath(source_file),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest,
+    }
+
+def load_payload(file):
+    """Unpickles the next object of file with the garbage collector paused.
+
+    The payload is hundreds of thousands of new objects, which would otherwise trigger
+    collections that scan all of them and about double the load time.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.load(file)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def load_cache(cache_file, source_file):
+    """Returns the payload cached for source_file, or None when there is no valid cache.
+
+    A cache with the same path, size and mtime is used as is. When only the mtime differs
+    (the file was touched or rewritten) the content hash decides, and the cache is kept if it matches.
+    """
+    try:
+        with open(cache_file, 'rb') as file:
+            cached_key = pickle.load(file)
+            key = source_key(source_file, cached_key.get("sha256"))
+            if cached_key == key:
+                return load_payload(file)
+            same_file = all(cached_key.get(field) == key[field] for field in ("format", "path", "size"))
+            if not same_file or file_digest(source_file) != cached_key.get("sha256"):
+                return None
+            payload = load_payload(file)
+    except Exception:
+        # Unpickling a damaged file can raise almost anything, the cache is then rebuilt
+        return None
+
+    # Same content with a new mtime, record it so the next run takes the fast path
+    save_cache(cache_file, source_file, payload, cached_key["sha256"])
+    return payload
+
+def save_cache(cache_file, source_file, payload, digest=None):
+    """Writes payload as the cache of source_file, replacing cache_file atomically."""
+    key = source_key(source_file, digest or file_digest(source_file))
+    temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_file, 'wb') as file:
+            # The key is a separate pickle so a stale cache is rejected without loading the payload
+            pickle.dump(key, file, protocol=PICKLE_PROTOCOL)
+            pickle.dump(payload, file, protocol=PICKLE_PROTOCOL)
+        os.replace(temporary_file, cache_file)
+    except BaseException:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+        raise
@@ -0,0 +1,67 @@
+"""
+Script Name: Standard Library CSV Engine
+
+Author: Pedro Romão
+
+Description:
+Reads the CSV exports with the csv module instead of pandas. It is the default: importing pandas and
+normalizing through DataFrames costs more than processing the rows one at a time, even on large exports.
+Cells that pandas.read_csv treats as missing by default ("", "nan", "NULL", "N/A", ...) are returned as
+NaN, so the generators see the same values with either engine.
+
+Date Created: 19/10/2024
+"""
+
+import csv
+import math
+
+from sg_arrow import is_arrow_input
+
+# Default na_values of pandas.read_csv
+NA_VALUES = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+NAN = float("nan")
+
+# "pandas" parses with the pandas C parser and "pyarrow" with the pandas pyarrow parser
+ENGINES = ("auto", "stdlib", "pandas", "pyarrow")
+
+def is_missing(value):
+    """Same as pandas.isna for a single cell: None or NaN."""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def choose_engine(csv_file, engine="auto"):
+    """Resolves "auto" to "stdlib", or to "pandas" for Parquet and Arrow files.
+
+    stdlib was faster end to end at every size measured, up to a 100k-row (9 MB) rules CSV
+    (4.3 s against 5.4 s) and a 200k-row (25 MB) groups CSV (2.1 s against 30 s), so pandas is only
+    picked where it is needed. Parquet and Arrow files are always read through pandas, "pyarrow"
+    only changes the CSV parser.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown CSV engine {engine!r}, expected one of {', '.join(ENGINES)}")
+    if is_arrow_input(csv_file):
+        if engine == "stdlib":
+            raise ValueError("Parquet and Arrow input needs the pandas engine")
+        return "pandas" if engine == "auto" else engine
+    return "stdlib" if engine == "auto" else engine
+
+def read_csv_rows(csv_file, chunk_size=None):
+    """Yields the CSV rows as dicts with missing cells set to NaN, in lists of chunk_size rows (all rows if None).
+
+    Cells are kept as text, pandas may instead parse a column that only holds numbers as numbers.
+    """
+    with open(csv_file, newline="", encoding="utf-8-sig") as file:
+        chunk = []
+        for row in csv.DictReader(file):
+            chunk.append({
+                key: NAN if value is None or value in NA_VALUES else value
+                for key, value in row.items()
+                if key is not None  # Cells beyond the header
+            })
+            if chunk_size and len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk or not chunk_size:
+            yield chunk
@@ -0,0 +1,103 @@
+"""
+Script Name: Incremental Regeneration State
+
+Author: Pedro Romão
+
+Description:
+Remembers, between runs of a generator, a content hash of the input rows of each security group together
+with the blocks rendered from them. On the next run only the groups whose hash changed are rendered again,
+the others are copied from the state file, so the outputs are the same as a full run at a fraction of the
+cost when few groups changed. State files are trusted pickles, like the JSON rule cache.
+
+Date Created: 19/10/2024
+"""
+
+import hashlib
+import os
+import pickle
+
+from sg_cache import load_payload
+
+# Bump when the rendered output changes, older states are then ignored
+STATE_FORMAT = 2
+PICKLE_PROTOCOL = 5
+
+def digest_bytes(data, extra=""):
+    """Returns a hex digest of data followed by the text extra."""
+    return hashlib.blake2b(data + extra.encode(), digest_size=16).hexdigest()
+
+def digest_rows(rows, extra=""):
+    """Returns a hex digest of a group's rows, given as tuples of plain values, in order, and extra."""
+    return digest_bytes(repr(list(rows)).encode(), extra)
+
+class IncrementalState:
+    """Per-group digests and rendered entries of the previous run, and those of the current one.
+
+    meta holds any other value the generator wants back on the next run, as previous_meta.
+    """
+
+    def __init__(self, path, generator):
+        self.path = path
+        self.generator = generator
+        state = self.load()
+        self.previous = state.get("groups", {})
+        self.previous_meta = state.get("meta", {})
+        self.groups = {}
+        self.meta = {}
+        self.changed = set()
+
+    def load(self):
+        """Returns the saved state, or an empty one if the file is missing or from another generator."""
+        try:
+            with open(self.path, 'rb') as file:
+                state = load_payload(file)
+        except Exception:
+            # A missing or damaged state (unpickling can raise almost anything) means a full run
+            return {}
+        if not isinstance(state, dict) or state.get("format") != STATE_FORMAT or state.get("generator") != self.generator:
+            return {}
+        return state
+
+    def update(self, group, digest):
+        """Records the digest of a group and tells whether it has to be rendered again."""
+        previous = self.previous.get(group)
+        self.groups[group] = (digest, [])
+        if previous is None or previous[0] != digest:
+            self.changed.add(group)
+            return True
+        return False
+
+    def reuse(self, group):
+        """Returns the entries rendered for an unchanged group by the previous run."""
+        return self.previous[group][1]
+
+    def add(self, group, entry):
+        """Keeps an entry rendered, or reused, for a group in this run."""
+        self.groups[group][1].append(entry)
+
+    def save(self):
+        temporary_file = f"{self.path}.{os.getpid()}.tmp"
+        state = {"format": STATE_FORMAT, "generator": self.generator, "groups": self.groups, "meta": self.meta}
+        try:
+            with open(temporary_file, 'wb') as file:
+                pickle.dump(state, file, protocol=PICKLE_PROTOCOL)
+            os.replace(temporary_file, self.path)
+        except BaseException:
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+            raise
+
+    def report(self):
+        """Summary of the groups added, changed, removed and reused since the previous run."""
+        added = sum(1 for group in self.changed if group not in self.previous)
+        removed = sum(1 for group in self.previous if group not in self.groups)
+        reused = len(self.groups) - len(self.changed)
+        lines = [
+            f"Incremental regeneration: {len(self.changed)} security groups rendered "
+            f"({added} added, {len(self.changed) - added} changed), {reused} reused, {removed} removed"
+        ]
+        # Without a previous state every group is new, only list the groups of a real diff
+        if self.previous:
+            lines += [f"  {'changed' if group in self.previous else 'added'}: {group}" for group in sorted(self.changed)]
+            lines += [f"  removed: {group}" for group in sorted(self.previous) if group not in self.groups]
+        return "\n".join(lines)
@@ -0,0 +1,164 @@
+"""
+Script Name: JSON Rule Records
+
+Author: Pedro Romão
+
+Description:
+Streams the "SecurityGroupRules" array of an aws ec2 describe-security-group-rules dump into compact SgRule
+records holding only the fields the generators use. Kept in its own module so the records can be pickled
+and shared by the scripts, their worker processes and the JSON rule cache.
+
+Date Created: 19/10/2024
+"""
+
+import json
+import re
+import sys
+
+# Scanner of the text before the array: string literals (skipped whole) and brackets (nesting depth)
+JSON_TOKEN = re.compile(r'["{}\[\]]')
+JSON_STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+KEY_SEPARATOR = re.compile(r'\s*:\s*')
+# What follows a complete array item
+ITEM_END = re.compile(r'\s*[,\]]')
+
+def intern_value(value):
+    """Interns strings so repeated GroupIds, protocols and addresses share one object."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+class SgRule:
+    """Compact record of the JSON rule fields used for matching, import commands and state synthesis.
+
+    tags is a tuple of (key, value) pairs, or None when the rule has no tags.
+    """
+
+    __slots__ = (
+        "security_group_rule_id", "group_id", "is_egress", "ip_protocol", "from_port", "to_port",
+        "cidr_ipv4", "prefix_list_id", "referenced_group_id", "description",
+        "group_owner_id", "cidr_ipv6", "tags"
+    )
+
+    def __init__(self, security_group_rule_id, group_id, is_egress, ip_protocol, from_port, to_port,
+                 cidr_ipv4=None, prefix_list_id=None, referenced_group_id=None, description="",
+                 group_owner_id=None, cidr_ipv6=None, tags=None):
+        self.security_group_rule_id = security_group_rule_id
+        self.group_id = intern_value(group_id)
+        self.is_egress = is_egress
+        self.ip_protocol = intern_value(ip_protocol)
+        self.from_port = from_port
+        self.to_port = to_port
+        self.cidr_ipv4 = intern_value(cidr_ipv4)
+        self.prefix_list_id = intern_value(prefix_list_id)
+        self.referenced_group_id = intern_value(referenced_group_id)
+        self.description = description
+        self.group_owner_id = intern_value(group_owner_id)
+        self.cidr_ipv6 = intern_value(cidr_ipv6)
+        self.tags = tags
+
+    @classmethod
+    def from_json(cls, rule):
+        """Projects a "SecurityGroupRules" item of the JSON dump into an SgRule."""
+        return cls(
+            rule["SecurityGroupRuleId"],
+            rule["GroupId"],
+            rule["IsEgress"],
+            rule.get("IpProtocol", ""),
+            rule.get("FromPort"),
+            rule.get("ToPort"),
+            rule.get("CidrIpv4"),
+            rule.get("PrefixListId"),
+            rule.get("ReferencedGroupInfo", {}).get("GroupId"),
+            rule.get("Description", ""),
+            rule.get("GroupOwnerId"),
+            rule.get("CidrIpv6"),
+            tuple((tag["Key"], tag["Value"]) for tag in rule["Tags"]) if rule.get("Tags") else None
+        )
+
+    @property
+    def address(self):
+        """Returns the CIDR, prefix list or referenced security group of the rule."""
+        return self.cidr_ipv4 or self.prefix_list_id or self.referenced_group_id
+
+def iter_json_rules(json_file, chunk_size=1 << 20):
+    """Yields the "SecurityGroupRules" items of a describe-security-group-rules dump one at a time."""
+    for rule in iter_json_array(json_file, "SecurityGroupRules", chunk_size):
+        yield SgRule.from_json(rule)
+
+def find_top_level_array(file, key, chunk_size):
+    """Reads file up to the opening bracket of the array under key in the top-level object.
+
+    Strings are skipped whole and brackets counted, so the same text in a string or in a nested
+    object (such as an output named key) does not match. Returns the text read after the bracket,
+    or None when the document has no such array.
+    """
+    quoted_key = json.dumps(key)
+    buffer = ""
+    position = 0
+    depth = 0
+    key_end = None
+    while True:
+        match = JSON_TOKEN.search(buffer, position)
+        string = match is not None and match.group() == '"' and JSON_STRING.match(buffer, match.start())
+        if match is None or (match.group() == '"' and not string):
+            # Out of tokens, or a string cut at the end of the buffer: read the next chunk and retry
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return None
+            buffer = buffer[position:] + chunk
+            if key_end is not None:
+                key_end -= position
+            position = 0
+            continue
+
+        if string:
+            position = string.end()
+            key_end = position if depth == 1 and string.group() == quoted_key else None
+            continue
+        if match.group() == "[" and key_end is not None and KEY_SEPARATOR.fullmatch(buffer, key_end, match.start()):
+            return buffer[match.end():]
+        key_end = None
+        depth += 1 if match.group() in "{[" else -1
+        position = match.end()
+
+def iter_json_array(json_file, key, chunk_size=1 << 20):
+    """Yields the items of the array under key in the top-level object of a JSON document one at a time.
+
+    The file is read in chunks of chunk_size characters and each item is decoded as soon
+    as it is complete, so the whole document is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file, 'r') as file:
+        buffer = find_top_level_array(file, key, chunk_size)
+        if buffer is None:
+            return
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position < len(buffer) and buffer[position] == "]":
+                return
+
+            start = position
+            try:
+                if position == len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, position)
+                item, position = decoder.raw_decode(buffer, position)
+                # A number cut at the end of the buffer decodes as a shorter number, so an item is
+                # only complete once the "," or "]" after it has been read
+                if not ITEM_END.match(buffer, position):
+                    raise json.JSONDecodeError("Need more data", buffer, position)
+            except json.JSONDecodeError:
+                # The item is cut at the end of the buffer, read the next chunk and retry
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer = buffer[start:] + chunk
+                position = 0
+                continue
+
+            yield item
+
+            if position > chunk_size:
+                buffer = buffer[position:]
+                position = 0
@@ -0,0 +1,157 @@
+"""
+Script Name: Terraform Output Writer
+
+Author: Pedro Romão
+
+Description:
+Shared output helpers for the security group scripts. Terraform blocks are written to the output file
+as soon as they are rendered instead of being accumulated in memory and written at the end, or sharded
+into one .tf file per security group (or VPC) in an output directory, written by a thread pool.
+
+Date Created: 19/10/2024
+"""
+
+import os
+import re
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+# Characters kept in shard file names, the others are replaced by "_"
+UNSAFE_FILE_NAME_CHARACTERS = re.compile(r"[^A-Za-z0-9._-]")
+
+class BlockWriter:
+    """Writes Terraform blocks to a file one at a time, through a buffer of buffer_size bytes.
+
+    The separator is written between consecutive blocks, never before the first or after the last,
+    and a buffer_size of 1 flushes after every line.
+    """
+
+    def __init__(self, path, separator="", buffer_size=DEFAULT_BUFFER_SIZE):
+        self.file = open(path, 'w', buffering=buffer_size)
+        self.separator = separator
+        self.count = 0
+
+    def write(self, block, shard=None):
+        """Writes one rendered block, shard is ignored (see ShardedWriter)."""
+        if self.count and self.separator:
+            self.file.write(self.separator)
+        self.file.write(block)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class GroupedWriter:
+    """Collects blocks per shard and writes them to a single file on close, as render(shards).
+
+    shards maps each shard to its blocks, in the order the shards were first written.
+    """
+
+    def __init__(self, path, render, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.path = path
+        self.render = render
+        self.buffer_size = buffer_size
+        self.shards = {}
+        self.count = 0
+
+    def write(self, block, shard):
+        self.shards.setdefault(shard, []).append(block)
+        self.count += 1
+
+    def close(self):
+        with open(self.path, 'w', buffering=self.buffer_size) as file:
+            file.write(self.render(self.shards))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ShardedWriter:
+    """Writes Terraform blocks to one file per shard, such as a security group, in output_dir.
+
+    Blocks are collected per shard and the files are written by a thread pool on close, as
+    "<shard>.<name>.tf" with the separator between consecutive blocks of a shard. Files whose
+    content did not change are left untouched, and files listed in the ".<name>.files" manifest
+    of the previous run that were not written this time are removed.
+    """
+
+    def __init__(self, output_dir, name, separator="", threads=None):
+        self.output_dir = output_dir
+        self.name = name
+        self.separator = separator
+        self.threads = threads
+        self.shards = {}
+        self.count = 0
+        self.stats = {}
+
+    def write(self, block, shard):
+        """Adds one rendered block to the file of shard."""
+        self.shards.setdefault(shard, []).append(block)
+        self.count += 1
+
+    def file_name(self, shard):
+        return f"{UNSAFE_FILE_NAME_CHARACTERS.sub('_', str(shard))}.{self.name}.tf"
+
+    def write_file(self, file_name, blocks):
+        """Writes one shard file unless it already has this content, returns whether it was written."""
+        path = os.path.join(self.output_dir, file_name)
+        text = self.separator.join(blocks)
+        try:
+            with open(path) as file:
+                if file.read() == text:
+                    return False
+        except OSError:
+            pass
+        with open(path, 'w') as file:
+            file.write(text)
+        return True
+
+    def close(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        files = {}
+        for shard, blocks in self.shards.items():
+            # Shards whose names only differ by unsafe characters share a file
+            files.setdefault(self.file_name(shard), []).extend(blocks)
+
+        with ThreadPoolExecutor(self.threads) as executor:
+            written = sum(executor.map(self.write_file, files, files.values()))
+
+        manifest = os.path.join(self.output_dir, f".{self.name}.files")
+        removed = 0
+        try:
+            with open(manifest) as file:
+                previous_files = file.read().split()
+        except OSError:
+            previous_files = []
+        for file_name in previous_files:
+            if file_name not in files and os.path.exists(os.path.join(self.output_dir, file_name)):
+                os.remove(os.path.join(self.output_dir, file_name))
+                removed += 1
+        with open(manifest, 'w') as file:
+            file.write("".join(f"{file_name}\n" for file_name in sorted(files)))
+
+        self.stats = {"files": len(files), "written": written, "unchanged": len(files) - written, "removed": removed}
+
+    def summary(self):
+        return (
+            f"Terraform {self.name} files in {self.output_dir}: {self.stats['files']} "
+            f"({self.stats['written']} written, {self.stats['unchanged']} unchanged, {self.stats['removed']} removed)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        # Leave the directory as it was if the generation failed
+        if exc_type is None:
+            self.close()
@@ -0,0 +1,83 @@
+"""
+Script Name: Generator Profiling
+
+Author: Pedro Romão
+
+Description:
+Per-phase timers and counters for the security group scripts. The generators call lap(phase) at the end
+of each step of their load, normalize, match, render and write work, so the time since the previous lap is
+added to that phase, and count() to keep counters such as rows, matches and misses. An optional cProfile
+run of the whole generation can be dumped to a pstats file.
+
+Date Created: 19/10/2024
+"""
+
+import cProfile
+import time
+
+PHASES = ("load", "normalize", "match", "render", "write")
+
+class Profiler:
+    """Accumulates seconds per phase and named counters, optionally under cProfile."""
+
+    enabled = True
+
+    def __init__(self, cprofile_file=None):
+        self.seconds = {}
+        self.counters = {}
+        self.cprofile_file = cprofile_file
+        self.cprofile = cProfile.Profile() if cprofile_file else None
+        self.started = self.last = time.perf_counter()
+        if self.cprofile:
+            self.cprofile.enable()
+
+    def lap(self, phase=None):
+        """Adds the time since the previous lap to phase, or only restarts the lap when phase is None."""
+        now = time.perf_counter()
+        if phase:
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def count(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def finish(self):
+        """Stops cProfile, dumps its stats and returns the summary table."""
+        total = time.perf_counter() - self.started
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_file)
+
+        phases = [phase for phase in PHASES if phase in self.seconds]
+        phases += [phase for phase in self.seconds if phase not in PHASES]
+        lines = [f"{'Phase':<12}{'Seconds':>12}{'Share':>9}"]
+        for phase in phases:
+            seconds = self.seconds[phase]
+            lines.append(f"{phase:<12}{seconds:>12.4f}{seconds / total:>9.1%}" if total else f"{phase:<12}{seconds:>12.4f}")
+        lines.append(f"{'total':<12}{total:>12.4f}")
+
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'Counter':<28}{'Value':>12}")
+            for counter, value in self.counters.items():
+                lines.append(f"{counter:<28}{value:>12}")
+        if self.cprofile:
+            lines.append("")
+            lines.append(f"cProfile stats written to {self.cprofile_file}")
+        return "\n".join(lines)
+
+class NullProfiler:
+    """Profiler stand-in used when profiling is off, every call is a no-op."""
+
+    enabled = False
+
+    def lap(self, phase=None):
+        pass
+
+    def count(self, counter, amount=1):
+        pass
+
+    def finish(self):
+        return ""
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,153 @@
+"""
+Script Name: Terraform Block Renderer
+
+Author: Pedro Romão
+
+Description:
+Renders the Terraform blocks written by the security group scripts. The constant text of each resource
+type's template is built once at import, and a block is rendered into a list of parts that is joined a
+single time instead of being built with repeated string concatenation.
+
+Date Created: 19/10/2024
+"""
+
+import shlex
+
+INGRESS_RULE_TYPE = "aws_vpc_security_group_ingress_rule"
+EGRESS_RULE_TYPE = "aws_vpc_security_group_egress_rule"
+
+# Address attributes of a rule block, in the order they are written (cidr_ipv6 only comes from JSON rules)
+ADDRESS_KEYS = ("cidr_ipv4", "referenced_security_group_id", "prefix_list_id", "cidr_ipv6")
+
+# Constant text of each template, computed once per resource type and attribute
+SECURITY_GROUP_PREFIX = '\nresource "aws_security_group" "'
+RULE_PREFIXES = {
+    resource_type: f'\nresource "{resource_type}" "'
+    for resource_type in (INGRESS_RULE_TYPE, EGRESS_RULE_TYPE)
+}
+ATTRIBUTE_PREFIXES = {key: f'  {key} = "' for key in ADDRESS_KEYS + ("description",)}
+# Import outputs: a Windows batch script of terraform import commands, Terraform 1.5+ import blocks or a
+# POSIX shell script running the imports of each security group as a batch, several batches in parallel
+IMPORT_FORMATS = ("bat", "blocks", "sh")
+IMPORT_HEADERS = {"bat": "@echo off\n", "blocks": "", "sh": ""}
+TAGS_START = "  tags = {\n"
+TAGS_END = "  }\n"
+BLOCK_END = "}\n"
+
+# Fixed parts of the POSIX shell import script, around its "case" of batches and its BATCHES list
+SHELL_SCRIPT_START = """#!/bin/sh
+# Imports the security group rules, one batch per security group and JOBS batches at a time.
+# Every import that succeeds is appended to PROGRESS_LOG and skipped when the script runs again,
+# so a failed run restarts where it stopped. Parallel batches wait for the state lock up to
+# LOCK_TIMEOUT. With STATE_DIR (local backend only), each batch imports into its own state file
+# STATE_DIR/<batch>.tfstate and batches never wait for each other.
+set -u
+JOBS="${JOBS:-4}"
+PROGRESS_LOG="${PROGRESS_LOG:-terraform_import_progress.log}"
+LOCK_TIMEOUT="${LOCK_TIMEOUT:-10m}"
+STATE_DIR="${STATE_DIR:-}"
+
+import_rule() {
+    if grep -qxF "$1 $2" "$PROGRESS_LOG"; then
+        return 0
+    fi
+    if [ -n "$STATE_DIR" ]; then
+        terraform import -input=false -state="$STATE_DIR/$BATCH.tfstate" "$1" "$2"
+    else
+        terraform import -input=false -lock-timeout="$LOCK_TIMEOUT" "$1" "$2"
+    fi && echo "$1 $2" >> "$PROGRESS_LOG"
+}
+
+run_batch() {
+    BATCH="$1"
+    status=0
+    case "$BATCH" in
+"""
+SHELL_SCRIPT_MIDDLE = """    esac
+    return $status
+}
+
+if [ "${1:-}" = "--batch" ]; then
+    # No batch number: some xargs run the command once even without input
+    [ -n "${2:-}" ] || exit 0
+    run_batch "$2"
+    exit $?
+fi
+
+touch "$PROGRESS_LOG"
+[ -z "$STATE_DIR" ] || mkdir -p "$STATE_DIR"
+"""
+SHELL_SCRIPT_END = """[ -n "$BATCHES" ] || exit 0
+for batch in $BATCHES; do
+    echo "$batch"
+done | xargs -n 1 -P "$JOBS" sh "$0" --batch || {
+    echo "Some imports failed, run the script again to retry them" >&2
+    exit 1
+}
+"""
+
+def render_security_group_block(resource_name, group_name, description, vpc_id, tags_dict):
+    """Renders an aws_security_group block, with a tags block only if there are tags."""
+    parts = [
+        f'{SECURITY_GROUP_PREFIX}{resource_name}" {{\n  name        = "{group_name}"\n'
+        f'  description = "{description}"\n  vpc_id      = "{vpc_id}"\n'
+    ]
+    if tags_dict:
+        parts.append(TAGS_START)
+        for key, value in tags_dict.items():
+            parts.append(f'    {key} = "{value}"\n')
+        parts.append(TAGS_END)
+    parts.append(BLOCK_END)
+    return "".join(parts)
+
+def render_rule_block(resource_type, rule_name, terraform_block):
+    """Renders an ingress or egress rule block from the terraform_block built by sg_rules, from a CSV or JSON rule."""
+    parts = [
+        f'{RULE_PREFIXES[resource_type]}{rule_name}" {{\n  security_group_id = "{terraform_block["rule_id"]}"\n'
+        f'  ip_protocol = "{terraform_block["ip_protocol"]}"\n'
+    ]
+
+    # Only include from_port and to_port if they are not -1
+    from_port = terraform_block["from_port"]
+    to_port = terraform_block["to_port"]
+    if from_port is not None and from_port != -1:
+        parts.append(f'  from_port = {from_port}\n')
+    if to_port is not None and to_port != -1:
+        parts.append(f'  to_port = {to_port}\n')
+
+    # Add CIDR, referenced security group ID, or prefix list if present
+    for key in ADDRESS_KEYS:
+        if key in terraform_block:
+            parts.append(f'{ATTRIBUTE_PREFIXES[key]}{terraform_block[key]}"\n')
+
+    description = terraform_block["description"]
+    if description:
+        parts.append(f'{ATTRIBUTE_PREFIXES["description"]}{description}"\n')
+
+    parts.append(BLOCK_END)
+    return "".join(parts)
+
+def render_import_command(resource_type, rule_name, rule_id):
+    """Renders the terraform import command of a rule, one line of the batch script."""
+    return f'terraform import {resource_type}.{rule_name} {rule_id}\n'
+
+def render_import_block(resource_type, rule_name, rule_id):
+    """Renders a Terraform 1.5+ import block, so the rules are imported by a single plan/apply."""
+    return f'\nimport {{\n  to = {resource_type}.{rule_name}\n  id = "{rule_id}"\n}}\n'
+
+def render_import_call(resource_type, rule_name, rule_id):
+    """Renders the import_rule call of a rule, one line of a batch of the POSIX shell script."""
+    return f'        import_rule {shlex.quote(f"{resource_type}.{rule_name}")} {shlex.quote(rule_id)} || status=1\n'
+
+def render_import_script(batches):
+    """Renders the POSIX shell import script from the import_rule calls of each batch (security group)."""
+    parts = [SHELL_SCRIPT_START]
+    for number, (batch, calls) in enumerate(batches.items(), 1):
+        comment = " ".join(str(batch).split())
+        parts.append(f"    {number})  # {comment}\n")
+        parts.extend(calls)
+        parts.append("        ;;\n")
+    parts.append(SHELL_SCRIPT_MIDDLE)
+    parts.append(f'BATCHES="{" ".join(str(number) for number in range(1, len(batches) + 1))}"\n')
+    parts.append(SHELL_SCRIPT_END)
+    return "".join(parts)
@@ -1,185 +1,1043 @@
-"""
-Script Name: Terraform Security Group Rules Import and Block Generation
-
-Author: Pedro Romão
-
-Description:
-This script generates Terraform configuration blocks and corresponding import commands for AWS security group rules
-based on data extracted from a CSV file and a JSON file. It processes security group rules to create both ingress 
-and egress rules, ensuring proper matching between the Terraform configuration and existing rules in the JSON file.
-
-Key Features:
-- Parses CSV input for security group rules.
-- Loads JSON rules to find matches for import commands.
-- Generates Terraform blocks for ingress and egress rules.
-- Creates a BAT script for executing Terraform import commands.
-
-Date Created: 19/10/2024
-"""
-
-import pandas as pd
-import json
-
-def extract_description(value):
-    """Extracts content within parentheses from a string."""
-    return value[value.find("(") + 1:value.find(")")] if "(" in value and ")" in value else ""
-
-def clean_value(value):
-    """Cleans the value by removing content within parentheses."""
-    return value.split("(")[0].strip() if "(" in value and ")" in value else value.strip()
-
-def match_terraform_to_json(terraform_block, json_rules):
-    """Matches a Terraform block to the corresponding JSON rule."""
-    rule_id = terraform_block["rule_id"]
-    for rule in json_rules:
-        if rule_id != rule["GroupId"]:
-            continue
-
-        is_egress = rule["IsEgress"]
-        if is_egress != ("egress" in terraform_block["rule_name"]):
-            continue
-
-        terraform_protocol = str(terraform_block.get("ip_protocol", "")).lower()
-        json_protocol = str(rule.get("IpProtocol", "")).lower()
-        
-        # Check for "All traffic" rules
-        if terraform_protocol != "-1" and terraform_protocol != json_protocol:
-            continue
-
-        if terraform_protocol != "-1":
-            if terraform_block.get("from_port") != rule.get("FromPort") or terraform_block.get("to_port") != rule.get("ToPort"):
-                continue
-
-        # Address types validation
-        terraform_address = (
-            terraform_block.get("cidr_ipv4") or 
-            terraform_block.get("prefix_list_id") or 
-            terraform_block.get("referenced_security_group_id")
-        )
-        json_address = (
-            rule.get("CidrIpv4") or 
-            rule.get("PrefixListId") or 
-            rule.get("ReferencedGroupInfo", {}).get("GroupId")
-        )
-        
-        if terraform_address != json_address:
-            continue
-
-        # Description comparison
-        if terraform_block.get("description", "").lower() != rule.get("Description", "").lower():
-            continue
-
-        return rule  # All conditions matched, return the rule
-
-    return None
-
-def generate_terraform_and_imports(csv_file, json_file, output_file, output_script_file):
-    """Generates Terraform blocks and import commands based on CSV and JSON data."""
-    df = pd.read_csv(csv_file)
-    with open(json_file, 'r') as file:
-        json_data = json.load(file)
-
-    # Access the "SecurityGroupRules" array
-    json_rules = json_data.get("SecurityGroupRules", [])
-
-    terraform_blocks = []
-    ingress_counters = {}
-    egress_counters = {}
-    excluded_group_name = "eks-cluster-sg-sitrd-pre-eks-cluster-01-135820731"
-
-    with open(output_script_file, 'w') as script_file:
-        script_file.write("@echo off\n")
-        rule_id_counts = {}
-
-        for index, row in df.iterrows():
-            group_name = row['GroupName'].replace(" ", "-").lower()
-            if group_name == excluded_group_name:
-                continue
-
-            is_egress = "outbound" in row['Type'].lower() or "egress" in row['Type'].lower()
-            from_port = to_port = protocol = None
-            cidr_ipv4 = "0.0.0.0/0"
-
-            # Set protocol based on conditions
-            if is_egress and pd.notna(row['IpRanges']) and "0.0.0.0/0" in clean_value(row['IpRanges']):
-                protocol = -1
-            elif not is_egress and (pd.isna(row['FromPort']) or pd.isna(row['ToPort'])):
-                protocol = -1
-            elif not pd.isna(row['FromPort']) and not pd.isna(row['ToPort']):
-                from_port = int(row['FromPort'])
-                to_port = int(row['ToPort'])
-                protocol = row['IpProtocol']
-
-            terraform_block = {
-                "rule_name": f"{group_name}-temp-rule{index + 1}",
-                "rule_id": row['GroupId'],
-                "description": "",
-                "ip_protocol": protocol,
-                "from_port": from_port,
-                "to_port": to_port
-            }
-
-            # Populate CIDR, prefix list, or referenced security group ID
-            if pd.notna(row['IpRanges']):
-                terraform_block["cidr_ipv4"] = clean_value(row['IpRanges'])
-                terraform_block["description"] = extract_description(row['IpRanges'])
-            elif pd.notna(row['UserIdGroupPairs']):
-                terraform_block["referenced_security_group_id"] = clean_value(row['UserIdGroupPairs'])
-                terraform_block["description"] = extract_description(row['UserIdGroupPairs'])
-            elif pd.notna(row['PrefixListIds']):
-                terraform_block["prefix_list_id"] = clean_value(row['PrefixListIds'])
-                terraform_block["description"] = extract_description(row['PrefixListIds'])
-
-            counters = egress_counters if is_egress else ingress_counters
-            counters[group_name] = counters.get(group_name, 0) + 1
-            rule_name = f"{group_name}-{'egress' if is_egress else 'ingress'}{counters[group_name]}"
-            resource_type = "aws_vpc_security_group_egress_rule" if is_egress else "aws_vpc_security_group_ingress_rule"
-            terraform_block["rule_name"] = rule_name
-
-            # Generate Terraform block
-            terraform_txt = f"""
-resource "{resource_type}" "{rule_name}" {{
-  security_group_id = "{terraform_block['rule_id']}"
-  ip_protocol = "{terraform_block['ip_protocol']}"
-"""
-            # Only include from_port and to_port if they are not -1
-            if from_port is not None and from_port != -1:
-                terraform_txt += f'  from_port = {from_port}\n'
-            if to_port is not None and to_port != -1:
-                terraform_txt += f'  to_port = {to_port}\n'
-
-            # Add CIDR, referenced security group ID, or prefix list if present
-            for key in ["cidr_ipv4", "referenced_security_group_id", "prefix_list_id"]:
-                if key in terraform_block:
-                    terraform_txt += f'  {key} = "{terraform_block[key]}"\n'
-                    
-            # Add description if present
-            if terraform_block["description"]:
-                terraform_txt += f'  description = "{terraform_block["description"]}"\n'
-
-            terraform_txt += "}\n"
-            terraform_blocks.append(terraform_txt)
-
-            # Match and write import commands
-            matching_rule = match_terraform_to_json(terraform_block, json_rules)
-            if matching_rule:
-                rule_id = matching_rule['SecurityGroupRuleId']
-                rule_id_counts[rule_id] = rule_id_counts.get(rule_id, 0) + 1
-                script_file.write(f'terraform import {resource_type}.{rule_name} {rule_id}\n')
-            else:
-                print(f"Warning: No matching JSON rule found for Terraform block {rule_name}")
-
-    # Write all Terraform blocks at once
-    with open(output_file, 'w') as output_file_handle:
-        output_file_handle.write("\n".join(terraform_blocks))
-
-    print(f"Terraform blocks generated: {len(terraform_blocks)}")
-    print(f"Terraform import commands generated: {len(rule_id_counts)}")
-
-
-# Fill with your file names
-csv_file = "security_rules.csv"
-json_file = "security_group_rules.json"
-output_file = "terraform_security_rules.txt"
-output_script_file = "terraform_import_script.bat"
-generate_terraform_and_imports(csv_file, json_file, output_file, output_script_file)
+"""
+Script Name: Terraform Security Group Rules Import and Block Generation
+
+Author: Pedro Romão
+
+Description:
+This script generates Terraform configuration blocks and corresponding import commands for AWS security group rules
+based on data extracted from a CSV file and a JSON file. It processes security group rules to create both ingress 
+and egress rules, ensuring proper matching between the Terraform configuration and existing rules in the JSON file.
+
+Key Features:
+- Parses CSV input for security group rules.
+- Loads JSON rules to find matches for import commands.
+- Generates Terraform blocks for ingress and egress rules.
+- Creates a BAT script for executing Terraform import commands.
+
+Date Created: 19/10/2024
+"""
+
+import heapq
+from collections import namedtuple
+from operator import attrgetter
+
+from sg_arrow import is_arrow_input, read_arrow_frames
+from sg_cache import file_digest, load_cache, save_cache
+from sg_csv import ENGINES, choose_engine, is_missing, read_csv_rows
+from sg_incremental import IncrementalState, digest_bytes, digest_rows
+from sg_json import SgRule, iter_json_array, iter_json_rules
+from sg_output import BlockWriter, DEFAULT_BUFFER_SIZE, GroupedWriter, ShardedWriter
+from sg_profile import NULL_PROFILER, Profiler
+from sg_state import (
+    check_groups_csv, managed_rules, rule_attributes, security_group_resources, state_resource, write_tfstate
+)
+from sg_render import (
+    EGRESS_RULE_TYPE, IMPORT_FORMATS, IMPORT_HEADERS, INGRESS_RULE_TYPE, render_import_block, render_import_call,
+    render_import_command, render_import_script, render_rule_block
+)
+
+# CSV columns read by the generator and their types, text for IDs and nullable integers for ports
+RULE_COLUMNS = ["GroupName", "GroupId", "Type", "IpProtocol", "FromPort", "ToPort",
+                "IpRanges", "UserIdGroupPairs", "PrefixListIds"]
+RULE_DTYPES = dict.fromkeys(RULE_COLUMNS, str) | {"FromPort": "Int32", "ToPort": "Int32"}
+
+# Security group left out of every output
+EXCLUDED_GROUP_NAME = "eks-cluster-sg-sitrd-pre-eks-cluster-01-135820731"
+
+ADDRESS_COLUMNS = [
+    ("IpRanges", "cidr_ipv4"),
+    ("UserIdGroupPairs", "referenced_security_group_id"),
+    ("PrefixListIds", "prefix_list_id"),
+]
+
+def extract_description(value):
+    """Extracts content within parentheses from a string."""
+    return value[value.find("(") + 1:value.find(")")] if "(" in value and ")" in value else ""
+
+def clean_value(value):
+    """Cleans the value by removing content within parentheses."""
+    return value.split("(")[0].strip() if "(" in value and ")" in value else value.strip()
+
+def clean_column(column):
+    """Vectorized clean_value/extract_description over a CSV column, with missing cells as ""."""
+    values = column.fillna("").astype(str)
+    has_parentheses = values.str.contains("(", regex=False) & values.str.contains(")", regex=False)
+    cleaned = values.str.split("(", n=1).str[0].str.strip().where(has_parentheses, values.str.strip())
+    # Same slice as extract_description: from the first "(" up to the first ")"
+    description = values.str.extract(r"^[^()]*\(([^)]*)\)", expand=False).fillna("")
+    return cleaned, description
+
+def normalize_rules(df):
+    """Normalizes the CSV rows into the typed columns used to build Terraform blocks.
+
+    Returns a DataFrame with group_name, rule_id, is_egress, ip_protocol, from_port, to_port,
+    address_key, address and description, computed for the whole CSV at once.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rule_type = df['Type'].str.lower()
+    is_egress = rule_type.str.contains("outbound", regex=False) | rule_type.str.contains("egress", regex=False)
+
+    present = [df[column].notna() for column, _ in ADDRESS_COLUMNS]
+    cleaned = [clean_column(df[column]) for column, _ in ADDRESS_COLUMNS]
+
+    # Set protocol based on conditions
+    ports_missing = df['FromPort'].isna() | df['ToPort'].isna()
+    egress_to_anywhere = is_egress & present[0] & cleaned[0][0].str.contains("0.0.0.0/0", regex=False)
+    all_traffic = egress_to_anywhere | (~is_egress & ports_missing)
+    has_ports = ~all_traffic & ~ports_missing
+    ip_protocol = np.where(
+        all_traffic, "-1",
+        np.where(has_ports, df['IpProtocol'].astype(object).map(str), "None")
+    )
+
+    # Only the first present of CIDR, referenced security group ID or prefix list is used
+    address_key = np.select(present, [key for _, key in ADDRESS_COLUMNS], default=None)
+    address = np.select(present, [values.to_numpy(object) for values, _ in cleaned], default=None)
+    description = np.select(present, [descriptions.to_numpy(object) for _, descriptions in cleaned], default="")
+
+    # Text columns are kept as Python objects: missing values stay None and itertuples does not
+    # convert every cell of an Arrow backed string column one at a time
+    return pd.DataFrame({
+        "group_name": df['GroupName'].str.replace(" ", "-", regex=False).str.lower().astype(object),
+        "rule_id": df['GroupId'].astype(object),
+        "is_egress": is_egress,
+        "ip_protocol": pd.Series(ip_protocol, index=df.index, dtype=object),
+        "from_port": df['FromPort'].where(has_ports).astype("Int64").astype(object).where(has_ports, None),
+        "to_port": df['ToPort'].where(has_ports).astype("Int64").astype(object).where(has_ports, None),
+        "address_key": pd.Series(address_key, index=df.index, dtype=object),
+        "address": pd.Series(address, index=df.index, dtype=object),
+        "description": pd.Series(description, index=df.index, dtype=object),
+    }, index=df.index)
+
+def assign_rule_names(rules, ingress_counters, egress_counters):
+    """Adds the rule_name column, numbering rules per group and direction in CSV order.
+
+    The counters hold the last number used for each group and are updated in place, so
+    numbering continues across calls.
+    """
+    import numpy as np
+
+    group_name = rules["group_name"]
+    is_egress = rules["is_egress"].astype(bool)
+    offset = np.where(
+        is_egress,
+        group_name.map(egress_counters).fillna(0),
+        group_name.map(ingress_counters).fillna(0)
+    ).astype(int)
+    number = rules.groupby([group_name, is_egress]).cumcount() + 1 + offset
+    direction = np.where(is_egress, "-egress", "-ingress")
+
+    rules = rules.assign(rule_name=group_name + direction + number.astype(str).astype(object))
+
+    last_numbers = number.groupby([group_name, is_egress]).max()
+    for (name, egress), last in last_numbers.items():
+        (egress_counters if egress else ingress_counters)[name] = int(last)
+    return rules
+
+# Normalized and named rule of the stdlib engine, with the fields of an itertuples row of normalize_rules
+RuleRow = namedtuple("RuleRow", [
+    "Index", "group_name", "rule_id", "is_egress", "ip_protocol", "from_port", "to_port",
+    "address_key", "address", "description", "rule_name"
+])
+
+def normalize_rule_rows(csv_rows, first_index, excluded_group_name, ingress_counters, egress_counters, indexes=None):
+    """Stdlib counterpart of normalize_rules and assign_rule_names for rows from sg_csv.read_csv_rows.
+
+    Rows of the excluded group are skipped and the others are returned as RuleRow records,
+    indexed from first_index in CSV order, or by indexes when given.
+    """
+    rules = []
+    for index, row in zip(indexes, csv_rows) if indexes is not None else enumerate(csv_rows, first_index):
+        group_name = row['GroupName'].replace(" ", "-").lower()
+        if group_name == excluded_group_name:
+            continue
+
+        rule_type = row['Type'].lower()
+        is_egress = "outbound" in rule_type or "egress" in rule_type
+        from_port = to_port = None
+        ip_protocol = "None"
+
+        # Set protocol based on conditions
+        ports_missing = is_missing(row['FromPort']) or is_missing(row['ToPort'])
+        if is_egress and not is_missing(row['IpRanges']) and "0.0.0.0/0" in clean_value(row['IpRanges']):
+            ip_protocol = "-1"
+        elif not is_egress and ports_missing:
+            ip_protocol = "-1"
+        elif not ports_missing:
+            from_port = int(float(row['FromPort']))
+            to_port = int(float(row['ToPort']))
+            ip_protocol = str(row['IpProtocol'])
+
+        # Only the first present of CIDR, referenced security group ID or prefix list is used
+        address_key = address = None
+        description = ""
+        for column, key in ADDRESS_COLUMNS:
+            if not is_missing(row[column]):
+                address_key = key
+                address = clean_value(row[column])
+                description = extract_description(row[column])
+                break
+
+        counters = egress_counters if is_egress else ingress_counters
+        counters[group_name] = counters.get(group_name, 0) + 1
+        rule_name = f"{group_name}-{'egress' if is_egress else 'ingress'}{counters[group_name]}"
+
+        rules.append(RuleRow(
+            index, group_name, row['GroupId'], is_egress, ip_protocol, from_port, to_port,
+            address_key, address, description, rule_name
+        ))
+    return rules
+
+def terraform_address(terraform_block):
+    """Returns the CIDR, prefix list or referenced security group of a Terraform block."""
+    return (
+        terraform_block.get("cidr_ipv4") or 
+        terraform_block.get("prefix_list_id") or 
+        terraform_block.get("referenced_security_group_id")
+    )
+
+def build_match_index(json_rules):
+    """Indexes the JSON rules by the fields compared when matching a Terraform block.
+
+    "exact" is keyed on (GroupId, IsEgress, protocol, FromPort, ToPort, address, description)
+    and "wildcard" drops the protocol and ports, for "All traffic" (-1) Terraform blocks.
+    Each bucket keeps the rules in their original JSON order.
+    """
+    exact = {}
+    wildcard = {}
+    for rule in json_rules:
+        group_id = rule.group_id
+        is_egress = rule.is_egress
+        address = rule.address
+        description = rule.description.lower()
+        json_protocol = str(rule.ip_protocol).lower()
+
+        exact_key = (group_id, is_egress, json_protocol, rule.from_port, rule.to_port, address, description)
+        exact.setdefault(exact_key, []).append(rule)
+        wildcard.setdefault((group_id, is_egress, address, description), []).append(rule)
+
+    return {"exact": exact, "wildcard": wildcard}
+
+def load_cached_rules(json_file, json_cache):
+    """Returns the JSON rules and their match index, from the json_cache file when it is up to date.
+
+    Otherwise the JSON is parsed and indexed and the cache is rewritten. The third value tells
+    whether the cache was used.
+    """
+    cached = load_cache(json_cache, json_file)
+    if cached is not None:
+        return cached["rules"], cached["index"], True
+
+    # Hash before parsing, so a JSON file changed meanwhile does not get a matching cache
+    digest = file_digest(json_file)
+    json_rules = list(iter_json_rules(json_file))
+    match_index = build_match_index(json_rules)
+    save_cache(json_cache, json_file, {"rules": json_rules, "index": match_index}, digest)
+    return json_rules, match_index, False
+
+def match_key(terraform_block):
+    """Returns the match index part ("exact" or "wildcard") and key of the bucket a Terraform block matches."""
+    rule_id = terraform_block["rule_id"]
+    is_egress = "egress" in terraform_block["rule_name"]
+    terraform_protocol = str(terraform_block.get("ip_protocol", "")).lower()
+    address = terraform_address(terraform_block)
+    description = terraform_block.get("description", "").lower()
+
+    # "All traffic" rules match regardless of the JSON protocol and ports
+    if terraform_protocol == "-1":
+        return "wildcard", (rule_id, is_egress, address, description)
+    return "exact", (
+        rule_id, is_egress, terraform_protocol,
+        terraform_block.get("from_port"), terraform_block.get("to_port"),
+        address, description
+    )
+
+def match_candidates(terraform_block, match_index):
+    """Returns the JSON rules matching a Terraform block, in JSON order."""
+    part, key = match_key(terraform_block)
+    return match_index[part].get(key) or ()
+
+def match_terraform_to_json(terraform_block, match_index):
+    """Matches a Terraform block to the corresponding JSON rule."""
+    bucket = match_candidates(terraform_block, match_index)
+    return bucket[0] if bucket else None  # First JSON rule with all conditions matched
+
+EXACT_MATCH_KEYS = ["rule_id", "match_egress", "protocol", "from_port", "to_port", "address", "description"]
+WILDCARD_MATCH_KEYS = ["rule_id", "match_egress", "address", "description"]
+
+def build_json_frame(json_rules):
+    """Loads the JSON rules into a DataFrame keyed like the CSV rules for match_rules_bulk."""
+    import pandas as pd
+
+    return pd.DataFrame({
+        "json_position": range(len(json_rules)),
+        "SecurityGroupRuleId": [rule.security_group_rule_id for rule in json_rules],
+        "rule_id": pd.array([rule.group_id for rule in json_rules], dtype=object),
+        "match_egress": pd.array([rule.is_egress for rule in json_rules], dtype=object),
+        "protocol": [str(rule.ip_protocol).lower() for rule in json_rules],
+        "from_port": pd.array([rule.from_port for rule in json_rules], dtype="Int64"),
+        "to_port": pd.array([rule.to_port for rule in json_rules], dtype="Int64"),
+        "address": [rule.address or "" for rule in json_rules],
+        "description": [rule.description.lower() for rule in json_rules],
+    })
+
+def match_rules_bulk(rules, json_frame):
+    """Matches every named CSV rule to the JSON rules with DataFrame merges.
+
+    Returns a dict of CSV row index to the SecurityGroupRuleIds of its candidates in JSON order,
+    like match_candidates, plus the lists of unmatched and ambiguous (several candidates) row indexes.
+    """
+    import pandas as pd
+
+    csv_df = pd.DataFrame({
+        "csv_index": rules.index,
+        "rule_id": rules["rule_id"].astype(object),
+        "match_egress": rules["rule_name"].str.contains("egress", regex=False).astype(object),
+        "protocol": rules["ip_protocol"].str.lower(),
+        "from_port": rules["from_port"].astype("Int64"),
+        "to_port": rules["to_port"].astype("Int64"),
+        "address": rules["address"].fillna("").astype(str),
+        "description": rules["description"].str.lower(),
+    })
+
+    # "All traffic" rules match regardless of the JSON protocol and ports
+    wildcard = csv_df["protocol"] == "-1"
+    candidates = pd.concat([
+        csv_df[~wildcard].merge(json_frame, on=EXACT_MATCH_KEYS),
+        csv_df[wildcard].merge(json_frame, on=WILDCARD_MATCH_KEYS),
+    ])[["csv_index", "json_position", "SecurityGroupRuleId"]]
+
+    candidates = candidates.sort_values(["csv_index", "json_position"], kind="stable")
+    candidate_counts = candidates["csv_index"].value_counts()
+
+    matches = {}
+    for csv_index, rule_id in zip(candidates["csv_index"].tolist(), candidates["SecurityGroupRuleId"].tolist()):
+        matches.setdefault(csv_index, []).append(rule_id)
+    # Rows of the same bucket share one tuple, as with render_rules
+    shared = {}
+    for csv_index, rule_ids in matches.items():
+        rule_ids = tuple(rule_ids)
+        matches[csv_index] = shared.setdefault(rule_ids, rule_ids)
+    unmatched = rules.index[~rules.index.isin(candidates["csv_index"])].tolist()
+    ambiguous = sorted(candidate_counts[candidate_counts > 1].index.tolist())
+    return matches, unmatched, ambiguous
+
+def read_rules_csv(csv_file, chunk_size=None, parser="c"):
+    """Yields the rules CSV as a single DataFrame, or as DataFrames of chunk_size rows.
+
+    Only the RULE_COLUMNS are parsed, with the RULE_DTYPES instead of inferred types, from a
+    memory-mapped file. parser="pyarrow" uses the pandas pyarrow parser for single reads, chunked
+    reads always use the C parser. Parquet and Arrow files are read through sg_arrow.
+    """
+    import pandas as pd
+
+    if is_arrow_input(csv_file):
+        yield from read_arrow_frames(csv_file, RULE_COLUMNS, chunk_size)
+        return
+
+    if chunk_size is None and parser == "pyarrow":
+        # The pyarrow parser reads the file with its own threads and does not support memory_map
+        yield pd.read_csv(csv_file, usecols=RULE_COLUMNS, dtype=RULE_DTYPES, engine="pyarrow")
+    elif chunk_size is None:
+        yield pd.read_csv(csv_file, usecols=RULE_COLUMNS, dtype=RULE_DTYPES, memory_map=True)
+    else:
+        with pd.read_csv(csv_file, usecols=RULE_COLUMNS, dtype=RULE_DTYPES, memory_map=True,
+                         chunksize=chunk_size) as reader:
+            yield from reader
+
+def terraform_block_from_row(row):
+    """Builds the terraform_block of a named rule from an itertuples row of the normalized rules."""
+    terraform_block = {
+        "rule_name": row.rule_name,
+        "rule_id": row.rule_id,
+        "description": row.description,
+        "ip_protocol": row.ip_protocol,
+        "from_port": row.from_port,
+        "to_port": row.to_port
+    }
+
+    # Populate CIDR, prefix list, or referenced security group ID
+    if row.address_key is not None:
+        terraform_block[row.address_key] = row.address
+    return terraform_block
+
+def render_rules(rows, match_index=None, bulk_matches=None, profiler=NULL_PROFILER):
+    """Renders the named CSV rules and matches each one to its JSON rule.
+
+    rows are RuleRow records or itertuples rows of the named rules DataFrame. Yields
+    (row index, resource type, rule name, Terraform block, SecurityGroupRuleIds of the candidates)
+    in CSV order, matching through bulk_matches when given and match_index otherwise.
+    The candidates are in JSON order, claim_rule picks the one imported. The rows of a bucket
+    share one tuple of its SecurityGroupRuleIds, built by the first of them.
+    """
+    bucket_ids = {}
+    for row in rows:
+        terraform_block = terraform_block_from_row(row)
+        rule_name = row.rule_name
+        resource_type = EGRESS_RULE_TYPE if row.is_egress else INGRESS_RULE_TYPE
+        profiler.lap("normalize")
+
+        if bulk_matches is not None:
+            rule_ids = bulk_matches.get(row.Index, ())
+        else:
+            part, key = match_key(terraform_block)
+            rule_ids = bucket_ids.get((part, key))
+            if rule_ids is None:
+                candidates = match_index[part].get(key, ())
+                rule_ids = bucket_ids[part, key] = tuple(rule.security_group_rule_id for rule in candidates)
+            profiler.count("JSON rules compared", len(rule_ids))
+        profiler.lap("match")
+
+        terraform_txt = render_rule_block(resource_type, rule_name, terraform_block)
+        profiler.lap("render")
+        yield row.Index, resource_type, rule_name, terraform_txt, rule_ids
+
+def claim_rule(rule_ids, claimed, cursors):
+    """Returns the first candidate SecurityGroupRuleId not claimed yet, and claims it.
+
+    Returns None when every candidate was claimed by an earlier block, such as a duplicate
+    CSV row, so the same rule is never imported twice.
+    cursors keeps, for each bucket, the position of its first candidate that may be unclaimed,
+    so the rows of a bucket do not each walk past the candidates the earlier ones claimed.
+    A bucket is keyed by its first ID and length: the buckets of one match index part never
+    share a rule, and an exact bucket as long as the wildcard bucket it starts holds the same rules.
+    """
+    if not rule_ids:
+        return None
+    bucket = (rule_ids[0], len(rule_ids))
+    position = cursors.get(bucket, 0)
+    # Candidates can also be claimed through the other part of the index, so still check each one
+    while position < len(rule_ids) and rule_ids[position] in claimed:
+        position += 1
+    if position == len(rule_ids):
+        cursors[bucket] = position
+        return None
+    cursors[bucket] = position + 1
+    claimed.add(rule_ids[position])
+    return rule_ids[position]
+
+# JSON rules of every security group, set in each worker process by init_shard_worker
+shard_json_rules = {}
+
+def init_shard_worker(json_rules_by_group):
+    global shard_json_rules
+    shard_json_rules = json_rules_by_group
+
+def render_shard(rules):
+    """Worker task: renders and matches the CSV rules of a shard of security groups."""
+    rows = rules if isinstance(rules, list) else list(rules.itertuples())
+    json_rules = [
+        rule
+        for group_id in dict.fromkeys(row.rule_id for row in rows)
+        for rule in shard_json_rules.get(group_id, ())
+    ]
+    return list(render_rules(rows, build_match_index(json_rules)))
+
+def render_rules_parallel(executor, rules, shard_count):
+    """Splits the named CSV rules into shard_count shards by GroupId and renders them in the worker pool.
+
+    rules is the named rules DataFrame, or a list of RuleRow records with the stdlib engine.
+    The shard results are merged back by row index, so they come out in CSV order.
+    """
+    if isinstance(rules, list):
+        shard_of_group = {}
+        shards = [[] for _ in range(shard_count)]
+        for row in rules:
+            shards[shard_of_group.setdefault(row.rule_id, len(shard_of_group) % shard_count)].append(row)
+    else:
+        import pandas as pd
+
+        shard_ids = pd.factorize(rules["rule_id"])[0] % shard_count
+        shards = [rules[shard_ids == shard] for shard in range(shard_count)]
+
+    futures = [executor.submit(render_shard, shard) for shard in shards if len(shard)]
+    return heapq.merge(*(future.result() for future in futures))
+
+def json_group_digests(json_rules):
+    """Digests the JSON rules of each GroupId in JSON order, the only JSON rules its CSV rows can match."""
+    rule_values = attrgetter(*SgRule.__slots__)
+    rules_by_group = {}
+    for rule in json_rules:
+        rules_by_group.setdefault(rule.group_id, []).append(rule_values(rule))
+    return {group_id: digest_rows(rules) for group_id, rules in rules_by_group.items()}
+
+def incremental_json_digests(json_file, json_rules, state):
+    """Returns the JSON rules and their json_group_digests, reusing the digests of the previous run
+    when the JSON file has the same content hash."""
+    json_hash = file_digest(json_file)
+    json_digests = None
+    if state.previous_meta.get("json_sha256") == json_hash:
+        json_digests = state.previous_meta.get("json_digests")
+    if json_digests is None:
+        json_rules = list(json_rules)
+        json_digests = json_group_digests(json_rules)
+    state.meta.update(json_sha256=json_hash, json_digests=json_digests)
+    return json_rules, json_digests
+
+def select_changed_groups(chunk, first_index, state, json_digests, excluded_group_name):
+    """Incremental mode: records a digest of the CSV rows and JSON rules of every group and keeps
+    the CSV rows of the groups that changed.
+
+    Groups are keyed by normalized group name, which rule names are numbered by, so the rows
+    of a changed group get the same names as in a full run. chunk is the CSV DataFrame, or
+    the list of rows of the stdlib engine indexed from first_index. Returns the rows left to
+    normalize with their row indexes, the entries of the unchanged groups reused from the
+    previous run, as (row index, resource type, rule name, Terraform block, candidate SecurityGroupRuleIds)
+    in CSV order, and the group of each row index.
+    """
+    if isinstance(chunk, list):
+        keys = [row['GroupName'].replace(" ", "-").lower() for row in chunk]
+        group_ids = [row['GroupId'] for row in chunk]
+        indexes = range(first_index, first_index + len(chunk))
+    else:
+        import pandas as pd
+
+        keys = chunk['GroupName'].str.replace(" ", "-", regex=False).str.lower().to_numpy(object)
+        group_ids = chunk['GroupId'].to_numpy(object)
+        indexes = chunk.index
+        # One stable 64 bit hash per row, much faster than iterating the cells
+        row_hashes = pd.util.hash_pandas_object(chunk[RULE_COLUMNS], index=False).to_numpy()
+
+    positions_by_group = {}
+    for position, key in enumerate(keys):
+        positions_by_group.setdefault(key, []).append(position)
+
+    changed = []
+    reused = []
+    for key, positions in positions_by_group.items():
+        if key == excluded_group_name:
+            changed += positions  # Dropped by the normalization
+            continue
+        json_digest = "".join(json_digests.get(group_id, "") for group_id in dict.fromkeys(group_ids[p] for p in positions))
+        if isinstance(chunk, list):
+            digest = digest_rows((tuple(chunk[p][column] for column in RULE_COLUMNS) for p in positions), json_digest)
+        else:
+            digest = digest_bytes(row_hashes[positions].tobytes(), json_digest)
+        if state.update(key, digest):
+            changed += positions
+        else:
+            reused += [(indexes[p], *entry) for p, entry in zip(positions, state.reuse(key))]
+    changed.sort()
+    reused.sort()
+    group_of_row = dict(zip(indexes, keys))
+
+    if isinstance(chunk, list):
+        return [chunk[p] for p in changed], [indexes[p] for p in changed], reused, group_of_row
+    return chunk.iloc[changed], None, reused, group_of_row
+
+def csv_group_names(chunk):
+    """Returns the normalized GroupName of each GroupId of the CSV rows, a DataFrame or sg_csv rows."""
+    if isinstance(chunk, list):
+        return {row['GroupId']: row['GroupName'].replace(" ", "-").lower() for row in chunk}
+    group_names = chunk['GroupName'].str.replace(" ", "-", regex=False).str.lower()
+    return dict(zip(chunk['GroupId'].tolist(), group_names.tolist()))
+
+def rule_group_name(rule_name):
+    """Returns the normalized group name a rule name was built from ("<group>-ingress<n>" or "<group>-egress<n>")."""
+    base = rule_name.rstrip("0123456789")
+    return base[:-len("-ingress")] if base.endswith("-ingress") else base[:-len("-egress")]
+
+def open_writers(output_file, output_script_file, output_dir, import_format, buffer_size):
+    """Returns the writers of the rule blocks and of the imports, and the renderer of an import."""
+    if import_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import_format {import_format!r}, expected one of {', '.join(IMPORT_FORMATS)}")
+    if output_dir:
+        block_writer = ShardedWriter(output_dir, "rules", separator="\n")
+    else:
+        block_writer = BlockWriter(output_file, separator="\n", buffer_size=buffer_size)
+
+    render_import = {
+        "bat": render_import_command, "blocks": render_import_block, "sh": render_import_call
+    }[import_format]
+    if output_dir and import_format == "blocks":
+        import_writer = ShardedWriter(output_dir, "imports")
+    elif import_format == "sh":
+        # Batches need all the imports of their security group, the script is written at the end
+        import_writer = GroupedWriter(output_script_file, render_import_script, buffer_size=buffer_size)
+    else:
+        import_writer = BlockWriter(output_script_file, buffer_size=buffer_size)
+        if IMPORT_HEADERS[import_format]:
+            import_writer.write(IMPORT_HEADERS[import_format])
+    return block_writer, import_writer, render_import
+
+class RunOutputs:
+    """What both generation modes track next to their writers: the rules skipped because managed_state
+    already holds them, the resources of tfstate_file, and the summary printed at the end."""
+
+    def __init__(self, managed_state=None, tfstate_file=None, region=None, profiler=NULL_PROFILER):
+        self.managed_state = managed_state
+        self.managed_rule_ids, self.managed_addresses = managed_rules(managed_state) if managed_state else ((), {})
+        self.managed_count = 0
+        self.conflict_count = 0
+        self.tfstate_file = tfstate_file
+        self.region = region
+        self.tfstate_resources = []
+        self.profiler = profiler
+
+    def skip(self, resource_type, rule_name, rule_id):
+        """Tells whether a rule is already in managed_state, and counts it.
+
+        A rule is managed when its SecurityGroupRuleId is in the state, or when a rule without a
+        match has an address of the state. Rule names are numbered by position, so an address
+        held by another SecurityGroupRuleId is a conflict: the rule is kept and a warning printed.
+        """
+        if not self.managed_state:
+            return False
+        address = f"{resource_type}.{rule_name}"
+        if rule_id in self.managed_rule_ids or (rule_id is None and address in self.managed_addresses):
+            self.managed_count += 1
+            self.profiler.count("already managed")
+            return True
+        if address in self.managed_addresses:
+            self.conflict_count += 1
+            self.profiler.count("address conflicts")
+            print(f"Warning: {address} is {self.managed_addresses[address] or 'another resource'} in "
+                  f"{self.managed_state}, not {rule_id}, rename the block or move the address before importing")
+        return False
+
+    def add_state(self, resource_type, rule_name, rule):
+        """Adds an imported rule, from its SgRule record, to the resources of tfstate_file."""
+        if self.tfstate_file:
+            self.tfstate_resources.append(state_resource(resource_type, rule_name, rule_attributes(rule, self.region)))
+
+    def write_state(self, groups_csv=None):
+        """Writes tfstate_file, with the security groups of groups_csv first when given."""
+        if not self.tfstate_file:
+            return
+        if groups_csv:
+            self.tfstate_resources = security_group_resources(groups_csv, self.region) + self.tfstate_resources
+        write_tfstate(self.tfstate_file, self.tfstate_resources)
+        self.profiler.lap("write")
+
+    def summary(self, block_writer, import_writer, import_count):
+        """Returns the block, import, skipped rule, output file and state counts of the run."""
+        lines = [
+            f"Terraform blocks generated: {block_writer.count}",
+            f"Terraform import commands generated: {import_count}",
+        ]
+        if self.managed_state:
+            lines.append(f"Rules already in {self.managed_state}, skipped: {self.managed_count}")
+            if self.conflict_count:
+                lines.append(f"Rules whose address is another rule in {self.managed_state}: {self.conflict_count}")
+        for writer in (block_writer, import_writer):
+            if isinstance(writer, ShardedWriter):
+                lines.append(writer.summary())
+        if self.tfstate_file:
+            lines.append(f"Terraform state written to {self.tfstate_file}: {len(self.tfstate_resources)} resources")
+        return "\n".join(lines)
+
+def generate_terraform_and_imports(csv_file, json_file, output_file, output_script_file, bulk_match=False,
+                                   chunk_size=None, buffer_size=DEFAULT_BUFFER_SIZE, workers=None,
+                                   profiler=NULL_PROFILER, engine="auto", json_cache=None, incremental_state=None,
+                                   output_dir=None, import_format="bat", tfstate_file=None, groups_csv=None,
+                                   region=None, managed_state=None, unclaimed=None):
+    """Generates Terraform blocks and import commands based on CSV and JSON data.
+
+    With bulk_match, the rows are matched up front by match_rules_bulk instead of one
+    match_terraform_to_json lookup per row. With chunk_size, the CSV is read, matched and
+    written chunk_size rows at a time, with the same rule names as a single pass.
+    Blocks are written as soon as they are rendered, through a buffer of buffer_size bytes.
+    With workers, matching and rendering are sharded by GroupId over that many processes
+    (always with the hash index) and the output is the same as a serial run.
+    With a sg_profile.Profiler, the time of each phase and the row and match counters are
+    collected and printed as a table at the end.
+    engine selects how the CSV is read: "pandas", "pyarrow" (pandas with the pyarrow parser),
+    "stdlib" (csv module, no pandas import) or "auto", which is stdlib unless pandas is needed:
+    bulk_match and Parquet/Arrow input (by file extension) need pandas.
+    With json_cache, the parsed JSON rules and match index are kept in that file (see sg_cache)
+    and reused while the JSON file is unchanged.
+    With incremental_state, the blocks of each security group are kept in that file with a digest
+    of its CSV rows and JSON rules, and the next run only normalizes, matches and renders the
+    groups whose digest changed (see sg_incremental). The ambiguous match warning of bulk_match
+    then only counts those groups.
+    With output_dir, the blocks go to one "<group>.rules.tf" file per security group in that
+    directory instead of output_file (see sg_output.ShardedWriter).
+    import_format "bat" writes output_script_file as a batch script of terraform import commands,
+    "blocks" writes Terraform 1.5+ import blocks instead, which import every rule in a single
+    plan/apply. With output_dir, the import blocks go next to the resources, in "<group>.imports.tf".
+    "sh" writes a POSIX shell script that imports each security group as a batch, runs several
+    batches in parallel and records its progress to resume after a failure (see sg_render).
+    With tfstate_file, a version 4 Terraform state holding every matched rule, filled from its
+    JSON rule, is also written, plus the security groups of groups_csv when given (see sg_state).
+    region is only used for the ARNs in that state.
+    With managed_state, a terraform.tfstate or terraform show -json file, the rules whose
+    SecurityGroupRuleId or address is already in that state are left out of every output,
+    and counted. Rule names are still numbered over all the rows, so they do not move.
+    unclaimed "report" lists the JSON rules that no CSV row claimed, except those of the excluded
+    group, to check the coverage of an account. "render" also writes their blocks and imports,
+    rendered from the JSON rule like generate_terraform_from_json and numbered on after the
+    CSV rules of their group.
+    """
+    if unclaimed not in (None, "report", "render"):
+        raise ValueError(f"Unknown unclaimed {unclaimed!r}, expected report or render")
+    if groups_csv:
+        # Fail before any output is written rather than when the state is
+        check_groups_csv(groups_csv)
+    from concurrent.futures import ProcessPoolExecutor
+
+    engine = choose_engine(csv_file, "pandas" if bulk_match and engine == "auto" else engine)
+    if bulk_match and engine == "stdlib":
+        raise ValueError("bulk_match needs the pandas engine")
+    state = None
+    if incremental_state:
+        if chunk_size:
+            raise ValueError("incremental_state needs the whole CSV, it does not work with chunk_size")
+        state = IncrementalState(incremental_state, "sg_rules")
+
+    # Stream the "SecurityGroupRules" array straight into the match index, or load both from the cache
+    profiler.lap()
+    outputs = RunOutputs(managed_state, tfstate_file, region, profiler)
+    match_index = None
+    if json_cache:
+        json_rules, match_index, cache_hit = load_cached_rules(json_file, json_cache)
+        profiler.count("JSON cache hits" if cache_hit else "JSON cache misses")
+    else:
+        json_rules = iter_json_rules(json_file)
+    if tfstate_file or unclaimed:
+        json_rules = list(json_rules)
+    if tfstate_file:
+        json_rules_by_id = {rule.security_group_rule_id: rule for rule in json_rules}
+    if state is not None:
+        json_rules, json_digests = incremental_json_digests(json_file, json_rules, state)
+    executor = None
+    if workers:
+        json_rules_by_group = {}
+        for rule in json_rules:
+            json_rules_by_group.setdefault(rule.group_id, []).append(rule)
+            profiler.count("JSON rules loaded")
+        executor = ProcessPoolExecutor(workers, initializer=init_shard_worker, initargs=(json_rules_by_group,))
+    elif bulk_match:
+        json_rules = list(json_rules)
+        profiler.count("JSON rules loaded", len(json_rules))
+        json_frame = build_json_frame(json_rules)
+    else:
+        if match_index is None:
+            match_index = build_match_index(json_rules)
+        profiler.count("JSON rules loaded", sum(len(bucket) for bucket in match_index["wildcard"].values()))
+    profiler.lap("load")
+
+    ambiguous_count = 0
+    ingress_counters = {}
+    egress_counters = {}
+    excluded_group_name = EXCLUDED_GROUP_NAME
+
+    block_writer, import_writer, render_import = open_writers(
+        output_file, output_script_file, output_dir, import_format, buffer_size
+    )
+    with import_writer, block_writer:
+        rule_id_counts = {}
+        claimed = set()
+        claim_cursors = {}
+        group_names = {}
+
+        first_index = 0
+        if engine == "stdlib":
+            chunks = read_csv_rows(csv_file, chunk_size)
+        else:
+            chunks = read_rules_csv(csv_file, chunk_size, "pyarrow" if engine == "pyarrow" else "c")
+        for chunk in chunks:
+            profiler.lap("load")
+            profiler.count("CSV rows", len(chunk))
+            if unclaimed:
+                group_names.update(csv_group_names(chunk))
+            indexes = None
+            if state is not None:
+                chunk, indexes, reused, group_of_row = select_changed_groups(
+                    chunk, first_index, state, json_digests, excluded_group_name
+                )
+                profiler.count("rows reused", len(reused))
+            if engine != "stdlib":
+                rules = normalize_rules(chunk)
+                rules = rules[rules["group_name"] != excluded_group_name]
+                rules = assign_rule_names(rules, ingress_counters, egress_counters)
+                rows = rules.itertuples()
+            else:
+                rules = rows = normalize_rule_rows(
+                    chunk, first_index, excluded_group_name, ingress_counters, egress_counters, indexes
+                )
+                first_index += len(chunk)
+            profiler.count("excluded rows", len(chunk) - len(rules))
+            profiler.lap("normalize")
+
+            if executor:
+                # Worker time is reported under render, it includes matching
+                rendered = render_rules_parallel(executor, rules, workers * 4)
+            elif bulk_match:
+                bulk_matches, _, ambiguous = match_rules_bulk(rules, json_frame)
+                ambiguous_count += len(ambiguous)
+                profiler.lap("match")
+                rendered = render_rules(rows, bulk_matches=bulk_matches, profiler=profiler)
+            else:
+                rendered = render_rules(rows, match_index, profiler=profiler)
+            if state is not None:
+                rendered = heapq.merge(rendered, reused)
+
+            for index, resource_type, rule_name, terraform_txt, rule_ids in rendered:
+                profiler.lap("render")
+                if state is not None:
+                    state.add(group_of_row[index], (resource_type, rule_name, terraform_txt, rule_ids))
+                rule_id = claim_rule(rule_ids, claimed, claim_cursors)
+                if outputs.skip(resource_type, rule_name, rule_id):
+                    continue
+                block_writer.write(terraform_txt, rule_group_name(rule_name))
+
+                # Write import commands
+                if rule_id:
+                    rule_id_counts[rule_id] = rule_id_counts.get(rule_id, 0) + 1
+                    import_writer.write(render_import(resource_type, rule_name, rule_id), rule_group_name(rule_name))
+                    if tfstate_file:
+                        outputs.add_state(resource_type, rule_name, json_rules_by_id[rule_id])
+                    profiler.count("matches")
+                elif rule_ids:
+                    print(f"Warning: Every JSON rule matching Terraform block {rule_name} is already imported "
+                          "by an earlier block (duplicate CSV row)")
+                    profiler.count("duplicates")
+                else:
+                    print(f"Warning: No matching JSON rule found for Terraform block {rule_name}")
+                    profiler.count("misses")
+                profiler.lap("write")
+
+        if unclaimed:
+            unclaimed_rules = [
+                rule for rule in json_rules
+                if rule.security_group_rule_id not in claimed and group_names.get(rule.group_id) != excluded_group_name
+            ]
+            profiler.count("unclaimed JSON rules", len(unclaimed_rules))
+        if unclaimed == "render":
+            if state is not None:
+                # Reused groups were not numbered by this run, continue after the names of their entries
+                for _, entries in state.groups.values():
+                    for resource_type, rule_name, _, _ in entries:
+                        base = rule_name.rstrip("0123456789")
+                        counters = egress_counters if resource_type == EGRESS_RULE_TYPE else ingress_counters
+                        group_name = rule_group_name(rule_name)
+                        counters[group_name] = max(counters.get(group_name, 0), int(rule_name[len(base):]))
+            for rule in unclaimed_rules:
+                group_name = group_names.get(rule.group_id, rule.group_id)
+                resource_type, rule_name, terraform_txt = render_json_rule(
+                    rule, group_name, ingress_counters, egress_counters
+                )
+                rule_id = rule.security_group_rule_id
+                if outputs.skip(resource_type, rule_name, rule_id):
+                    continue
+                block_writer.write(terraform_txt, group_name)
+                rule_id_counts[rule_id] = 1
+                import_writer.write(render_import(resource_type, rule_name, rule_id), group_name)
+                outputs.add_state(resource_type, rule_name, rule)
+            profiler.lap("render")
+
+    profiler.lap("write")
+    if executor:
+        executor.shutdown()
+    if state is not None:
+        state.save()
+        profiler.lap("write")
+    outputs.write_state(groups_csv)
+
+    if ambiguous_count:
+        print(f"Warning: {ambiguous_count} CSV rows match several JSON rules, "
+              "the first one not imported yet is used")
+    print(outputs.summary(block_writer, import_writer, len(rule_id_counts)))
+    if unclaimed and not unclaimed_rules:
+        print(f"Every JSON rule is matched by a CSV row ({len(claimed)} rules)")
+    elif unclaimed:
+        rendered_note = ", rendered with their imports" if unclaimed == "render" else ""
+        print(f"JSON rules not matched by any CSV row: {len(unclaimed_rules)}{rendered_note}")
+        for rule in unclaimed_rules:
+            group_name = group_names.get(rule.group_id, "not in the CSV")
+            direction = "egress" if rule.is_egress else "ingress"
+            print(f"  {rule.security_group_rule_id} ({direction}, {rule.group_id}, {group_name})")
+    if state is not None:
+        print(state.report())
+    if profiler.enabled:
+        print(profiler.finish())
+
+
+def load_group_names(groups_json):
+    """Returns the normalized GroupName of each GroupId of a describe-security-groups dump."""
+    return {
+        group["GroupId"]: group["GroupName"].replace(" ", "-").lower()
+        for group in iter_json_array(groups_json, "SecurityGroups")
+    }
+
+def terraform_block_from_json(rule, rule_name):
+    """Builds the terraform_block of a JSON rule, with its exact protocol, ports and address."""
+    terraform_block = {
+        "rule_name": rule_name,
+        "rule_id": rule.group_id,
+        "description": rule.description,
+        "ip_protocol": rule.ip_protocol,
+        "from_port": rule.from_port,
+        "to_port": rule.to_port
+    }
+    for key, value in (("cidr_ipv4", rule.cidr_ipv4), ("referenced_security_group_id", rule.referenced_group_id),
+                       ("prefix_list_id", rule.prefix_list_id), ("cidr_ipv6", rule.cidr_ipv6)):
+        if value:
+            terraform_block[key] = value
+            break
+    return terraform_block
+
+def render_json_rule(rule, group_name, ingress_counters, egress_counters):
+    """Names a JSON rule after its group, numbering on from the counters, and renders its block.
+
+    Returns (resource type, rule name, Terraform block).
+    """
+    counters = egress_counters if rule.is_egress else ingress_counters
+    counters[group_name] = counters.get(group_name, 0) + 1
+    rule_name = f"{group_name}-{'egress' if rule.is_egress else 'ingress'}{counters[group_name]}"
+    resource_type = EGRESS_RULE_TYPE if rule.is_egress else INGRESS_RULE_TYPE
+    terraform_txt = render_rule_block(resource_type, rule_name, terraform_block_from_json(rule, rule_name))
+    return resource_type, rule_name, terraform_txt
+
+def generate_terraform_from_json(json_file, groups_json, output_file, output_script_file,
+                                 buffer_size=DEFAULT_BUFFER_SIZE, profiler=NULL_PROFILER, output_dir=None,
+                                 import_format="bat", tfstate_file=None, region=None, managed_state=None):
+    """Generates Terraform blocks and import commands from the JSON rules alone, without the CSV.
+
+    Every rule of the describe-security-group-rules dump is rendered in JSON order and imported
+    by its own SecurityGroupRuleId, so there is nothing to match. Rules are named after the
+    GroupName found in the describe-security-groups dump groups_json (the GroupId when the group
+    is missing) and numbered per group and direction in JSON order, so the numbers can differ
+    from those of a CSV run. The other options are those of generate_terraform_and_imports.
+    """
+    profiler.lap()
+    group_names = load_group_names(groups_json)
+    outputs = RunOutputs(managed_state, tfstate_file, region, profiler)
+    profiler.lap("load")
+
+    ingress_counters = {}
+    egress_counters = {}
+    unnamed_groups = set()
+    block_writer, import_writer, render_import = open_writers(
+        output_file, output_script_file, output_dir, import_format, buffer_size
+    )
+    with import_writer, block_writer:
+        for rule in iter_json_rules(json_file):
+            profiler.lap("load")
+            profiler.count("JSON rules loaded")
+            group_name = group_names.get(rule.group_id)
+            if group_name is None:
+                unnamed_groups.add(rule.group_id)
+                group_name = rule.group_id
+            if group_name == EXCLUDED_GROUP_NAME:
+                continue
+
+            resource_type, rule_name, terraform_txt = render_json_rule(
+                rule, group_name, ingress_counters, egress_counters
+            )
+            rule_id = rule.security_group_rule_id
+            profiler.lap("render")
+            if outputs.skip(resource_type, rule_name, rule_id):
+                continue
+
+            block_writer.write(terraform_txt, group_name)
+            import_writer.write(render_import(resource_type, rule_name, rule_id), group_name)
+            outputs.add_state(resource_type, rule_name, rule)
+            profiler.lap("write")
+
+    profiler.lap("write")
+    outputs.write_state()
+
+    if unnamed_groups:
+        print(f"Warning: {len(unnamed_groups)} security groups are not in {groups_json}, "
+              "their rules are named by GroupId")
+    print(outputs.summary(block_writer, import_writer, block_writer.count))
+    if profiler.enabled:
+        print(profiler.finish())
+
+def generate_rules_and_imports(csv_file="security_rules.csv", json_file="security_group_rules.json",
+                               output_file="terraform_security_rules.txt",
+                               output_script_file="terraform_import_script.bat", **options):
+    """Library entry point: generates the rule blocks and import script, with the usual file names by default.
+
+    options are passed on to generate_terraform_and_imports (bulk_match, chunk_size, buffer_size,
+    workers, profiler, engine, json_cache, incremental_state, output_dir, import_format, tfstate_file,
+    groups_csv, region, managed_state, unclaimed).
+    """
+    generate_terraform_and_imports(csv_file, json_file, output_file, output_script_file, **options)
+
+DEFAULT_IMPORT_FILES = {
+    "bat": "terraform_import_script.bat", "blocks": "terraform_imports.tf", "sh": "terraform_import_script.sh"
+}
+
+def main(argv=None):
+    """Command line entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generates Terraform rule blocks and import commands.")
+    parser.add_argument("--csv", default="security_rules.csv",
+                        help="Security group rules CSV export, or a .parquet/.arrow/.feather file")
+    parser.add_argument("--json", default="security_group_rules.json", help="describe-security-group-rules output")
+    parser.add_argument("--output", default="terraform_security_rules.txt", help="Terraform blocks output file")
+    parser.add_argument("--output-dir", help="Write one <group>.rules.tf file per security group here instead of --output")
+    parser.add_argument("--script",
+                        help="Import output file (default: terraform_import_script.bat, terraform_imports.tf for blocks "
+                             "or terraform_import_script.sh for sh)")
+    parser.add_argument("--imports", choices=IMPORT_FORMATS, default="bat",
+                        help="Write a batch script of terraform import commands, Terraform 1.5+ import blocks "
+                             "or a parallel, resumable POSIX shell script")
+    parser.add_argument("--tfstate", metavar="FILE", help="Also write a Terraform state of the matched rules to FILE")
+    parser.add_argument("--groups-csv", help="Security groups CSV export whose groups are added to --tfstate")
+    parser.add_argument("--region", help="AWS region of the ARNs in --tfstate")
+    parser.add_argument("--managed-state", metavar="FILE",
+                        help="Skip the rules already in this terraform.tfstate or terraform show -json output")
+    parser.add_argument("--from-json", metavar="GROUPS_JSON",
+                        help="Generate from the --json rules alone, without --csv, naming the rules after the "
+                             "groups of this describe-security-groups output")
+    parser.add_argument("--unclaimed", choices=("report", "render"),
+                        help="List the JSON rules no CSV row matched, or also write blocks and imports for them")
+    parser.add_argument("--engine", choices=ENGINES, default="auto",
+                        help="CSV reader: pandas, pyarrow, stdlib (csv module) or auto (stdlib unless pandas "
+                             "is needed)")
+    parser.add_argument("--bulk-match", action="store_true", help="Match all rows with DataFrame merges")
+    parser.add_argument("--chunk-size", type=int, help="Read and process the CSV this many rows at a time")
+    parser.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE, help="Output buffer size in bytes")
+    parser.add_argument("--workers", type=int, help="Number of worker processes, sharded by GroupId")
+    parser.add_argument("--json-cache", metavar="FILE",
+                        help="Cache the parsed JSON rules in FILE and reuse them while the JSON is unchanged")
+    parser.add_argument("--incremental", metavar="STATE_FILE",
+                        help="Only render the security groups changed since the run that wrote STATE_FILE")
+    parser.add_argument("--profile", action="store_true", help="Print per-phase timings and counters")
+    parser.add_argument("--cprofile", metavar="FILE", help="Also dump cProfile stats to FILE (implies --profile)")
+    args = parser.parse_args(argv)
+    profiler = Profiler(args.cprofile) if args.profile or args.cprofile else NULL_PROFILER
+
+    if args.from_json:
+        generate_terraform_from_json(
+            args.json, args.from_json, args.output,
+            args.script or DEFAULT_IMPORT_FILES[args.imports],
+            buffer_size=args.buffer_size,
+            profiler=profiler,
+            output_dir=args.output_dir,
+            import_format=args.imports,
+            tfstate_file=args.tfstate,
+            region=args.region,
+            managed_state=args.managed_state
+        )
+        return
+
+    generate_rules_and_imports(
+        args.csv, args.json, args.output,
+        args.script or DEFAULT_IMPORT_FILES[args.imports],
+        bulk_match=args.bulk_match,
+        chunk_size=args.chunk_size,
+        buffer_size=args.buffer_size,
+        workers=args.workers,
+        engine=args.engine,
+        json_cache=args.json_cache,
+        incremental_state=args.incremental,
+        output_dir=args.output_dir,
+        import_format=args.imports,
+        tfstate_file=args.tfstate,
+        groups_csv=args.groups_csv,
+        region=args.region,
+        managed_state=args.managed_state,
+        unclaimed=args.unclaimed,
+        profiler=profiler
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Script Name: Terraform State Synthesis
+
+Author: Pedro Romão
+
+Description:
+Builds a Terraform state file (format version 4) holding the aws_vpc_security_group_ingress_rule and
+aws_vpc_security_group_egress_rule instances of the generated rule blocks, from their JSON rule records,
+and the aws_security_group instances of the security groups CSV. A new workspace with this state and the
+generated configuration is already "imported", without one terraform import (and AWS call) per rule.
+Attributes that are not in the exports, such as the inline rules of the security groups, are filled in by
+the first terraform plan or apply refresh. Also reads the rules an existing state already manages, so the
+generators can leave them out.
+
+Usage: python sg_state.py terraform.tfstate checks a state file against the format.
+
+Date Created: 19/10/2024
+"""
+
+import csv
+import json
+import uuid
+
+from sg_csv import is_missing, read_csv_rows
+from sg_json import iter_json_array
+
+STATE_VERSION = 4
+# Oldest Terraform release that reads these states together with import blocks
+TERRAFORM_VERSION = "1.5.0"
+AWS_PROVIDER = 'provider["registry.terraform.io/hashicorp/aws"]'
+SECURITY_GROUP_TYPE = "aws_security_group"
+# Columns of the security groups CSV that its state resources are built from (OwnerId, for the ARNs, is optional)
+GROUP_COLUMNS = ("GroupId", "GroupName", "VpcId", "Description", "Tags")
+
+# Attributes of each resource type and the schema version of its instances, for the format check
+RULE_ATTRIBUTES = (
+    "arn", "cidr_ipv4", "cidr_ipv6", "description", "from_port", "id", "ip_protocol", "prefix_list_id",
+    "referenced_security_group_id", "security_group_id", "security_group_rule_id", "tags", "tags_all", "to_port",
+)
+SECURITY_GROUP_ATTRIBUTES = (
+    "arn", "description", "egress", "id", "ingress", "name", "name_prefix", "owner_id", "revoke_rules_on_delete",
+    "tags", "tags_all", "timeouts", "vpc_id",
+)
+RESOURCE_SCHEMAS = {
+    "aws_vpc_security_group_ingress_rule": (0, RULE_ATTRIBUTES),
+    "aws_vpc_security_group_egress_rule": (0, RULE_ATTRIBUTES),
+    SECURITY_GROUP_TYPE: (1, SECURITY_GROUP_ATTRIBUTES),
+}
+
+def ec2_arn(region, account, resource):
+    """Returns the ARN of an EC2 resource, or None when the region or the account is unknown."""
+    if not region or not account:
+        return None
+    return f"arn:aws:ec2:{region}:{account}:{resource}"
+
+def rule_port(port):
+    """Ports of -1 (all traffic) are null in the state, like in the generated blocks."""
+    return None if port is None or port == -1 else int(port)
+
+def rule_attributes(rule, region=None):
+    """Returns the state attributes of an ingress or egress rule from its sg_json.SgRule record."""
+    tags = dict(rule.tags) if rule.tags else None
+    return {
+        "arn": ec2_arn(region, rule.group_owner_id, f"security-group-rule/{rule.security_group_rule_id}"),
+        "cidr_ipv4": rule.cidr_ipv4,
+        "cidr_ipv6": rule.cidr_ipv6,
+        "description": rule.description or None,
+        "from_port": rule_port(rule.from_port),
+        "id": rule.security_group_rule_id,
+        "ip_protocol": str(rule.ip_protocol),
+        "prefix_list_id": rule.prefix_list_id,
+        "referenced_security_group_id": rule.referenced_group_id,
+        "security_group_id": rule.group_id,
+        "security_group_rule_id": rule.security_group_rule_id,
+        "tags": tags,
+        "tags_all": tags or {},
+        "to_port": rule_port(rule.to_port),
+    }
+
+def security_group_attributes(group_id, group_name, description, vpc_id, tags_dict, owner_id=None, region=None):
+    """Returns the state attributes of a security group from its row of the security groups CSV.
+
+    The inline ingress and egress rules are left empty, the rules are managed by their own resources.
+    """
+    return {
+        "arn": ec2_arn(region, owner_id, f"security-group/{group_id}"),
+        "description": description,
+        "egress": [],
+        "id": group_id,
+        "ingress": [],
+        "name": group_name,
+        "name_prefix": "",
+        "owner_id": owner_id,
+        "revoke_rules_on_delete": False,
+        "tags": tags_dict or None,
+        "tags_all": tags_dict or {},
+        "timeouts": None,
+        "vpc_id": vpc_id,
+    }
+
+def check_groups_csv(groups_csv):
+    """Raises a ValueError naming the GROUP_COLUMNS missing from the header of the security groups CSV."""
+    with open(groups_csv, newline="", encoding="utf-8-sig") as file:
+        header = next(csv.reader(file), [])
+    missing = [column for column in GROUP_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"{groups_csv} has no {', '.join(missing)} column{'s' if len(missing) > 1 else ''}, "
+                         f"the security group states need {', '.join(GROUP_COLUMNS)}")
+
+def security_group_resources(groups_csv, region=None):
+    """Returns the aws_security_group resources of the security groups CSV, named like the blocks of sg_block.
+
+    The CSV needs the GROUP_COLUMNS (see check_groups_csv), and an OwnerId column for the ARNs.
+    """
+    from sg_block import parse_tags
+
+    resources = []
+    for row in next(read_csv_rows(groups_csv)):
+        values = {key: None if is_missing(value) else value for key, value in row.items()}
+        group_name = row['GroupName'].replace(" ", "-").lower()
+        attributes = security_group_attributes(
+            values['GroupId'], group_name, values['Description'], values['VpcId'], parse_tags(row['Tags']),
+            values.get('OwnerId'), region
+        )
+        resources.append(state_resource(SECURITY_GROUP_TYPE, group_name, attributes))
+    return resources
+
+def state_resource(resource_type, name, attributes):
+    """Wraps the attributes of a single managed instance into a state resource."""
+    schema_version, _ = RESOURCE_SCHEMAS[resource_type]
+    return {
+        "mode": "managed",
+        "type": resource_type,
+        "name": name,
+        "provider": AWS_PROVIDER,
+        "instances": [{"schema_version": schema_version, "attributes": attributes, "sensitive_attributes": []}],
+    }
+
+def write_tfstate(path, resources, lineage=None, serial=1):
+    """Writes the resources as a version 4 state file, with a new lineage unless one is given."""
+    state = {
+        "version": STATE_VERSION,
+        "terraform_version": TERRAFORM_VERSION,
+        "serial": serial,
+        "lineage": lineage or str(uuid.uuid4()),
+        "outputs": {},
+        "resources": resources,
+        "check_results": None,
+    }
+    with open(path, 'w') as file:
+        json.dump(state, file, indent=2)
+        file.write("\n")
+
+def resource_address(resource, index_key=None):
+    """Returns the address of a state resource instance, such as module.net.aws_security_group.web["a"]."""
+    address = f"{resource['type']}.{resource['name']}"
+    if resource.get("mode") == "data":
+        address = f"data.{address}"
+    if resource.get("module"):
+        address = f"{resource['module']}.{address}"
+    if index_key is not None:
+        address += f"[{json.dumps(index_key)}]"
+    return address
+
+def iter_show_json_resources(module):
+    """Yields the resources of a module of terraform show -json output and of its child modules."""
+    yield from module.get("resources") or ()
+    for child_module in module.get("child_modules") or ():
+        if isinstance(child_module, dict):
+            yield from iter_show_json_resources(child_module)
+
+def managed_rules(state_file):
+    """Returns the SecurityGroupRuleIds found in a state file, and a dict of each resource address
+    found to its SecurityGroupRuleId (None for resources that are not rules).
+
+    state_file is either a state file (terraform.tfstate, terraform state pull), whose resources
+    are streamed one at a time, or the output of terraform show -json, which is loaded at once.
+    """
+    with open(state_file) as file:
+        show_json = '"format_version"' in file.read(4096)
+
+    addresses = {}
+    if show_json:
+        with open(state_file) as file:
+            root_module = json.load(file).get("values", {}).get("root_module", {})
+        for resource in iter_show_json_resources(root_module):
+            if not isinstance(resource, dict) or "address" not in resource:
+                continue
+            values = resource.get("values")
+            addresses[resource["address"]] = values.get("security_group_rule_id") if isinstance(values, dict) else None
+    else:
+        for resource in iter_json_array(state_file, "resources"):
+            if not isinstance(resource, dict) or "type" not in resource or "name" not in resource:
+                continue
+            for instance in resource.get("instances") or ():
+                if not isinstance(instance, dict):
+                    continue
+                attributes = instance.get("attributes")
+                rule_id = attributes.get("security_group_rule_id") if isinstance(attributes, dict) else None
+                addresses[resource_address(resource, instance.get("index_key"))] = rule_id
+    rule_ids = set(addresses.values())
+    rule_ids.discard(None)
+    return rule_ids, addresses
+
+def check_tfstate(state):
+    """Checks a parsed state against the version 4 format and the attributes written by this module.
+
+    Returns the list of problems found, empty when the state is valid.
+    """
+    problems = []
+    if state.get("version") != STATE_VERSION:
+        problems.append(f"version is {state.get('version')!r}, expected {STATE_VERSION}")
+    for key, kind in (("terraform_version", str), ("serial", int), ("lineage", str), ("outputs", dict),
+                      ("resources", list)):
+        if not isinstance(state.get(key), kind):
+            problems.append(f"{key} is missing or not a {kind.__name__}")
+
+    addresses = set()
+    for resource in state.get("resources") or ():
+        address = f"{resource.get('type')}.{resource.get('name')}"
+        if address in addresses:
+            problems.append(f"{address} appears more than once")
+        addresses.add(address)
+        if resource.get("mode") != "managed" or not resource.get("provider"):
+            problems.append(f"{address} is not a managed resource with a provider")
+        if resource.get("type") not in RESOURCE_SCHEMAS:
+            continue
+
+        schema_version, attributes = RESOURCE_SCHEMAS[resource["type"]]
+        for instance in resource.get("instances") or ():
+            if instance.get("schema_version") != schema_version:
+                problems.append(f"{address} has schema_version {instance.get('schema_version')!r}")
+            missing = set(attributes) - set(instance.get("attributes") or {})
+            if missing:
+                problems.append(f"{address} is missing attributes {', '.join(sorted(missing))}")
+            elif not instance["attributes"]["id"]:
+                problems.append(f"{address} has no id")
+        if not resource.get("instances"):
+            problems.append(f"{address} has no instances")
+    return problems
+
+def main(argv=None):
+    """Command line entry point: checks state files and exits with an error if one is invalid."""
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Checks Terraform state files written by the generators.")
+    parser.add_argument("state_files", nargs="+", metavar="STATE_FILE")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for state_file in args.state_files:
+        with open(state_file) as file:
+            state = json.load(file)
+        problems = check_tfstate(state)
+        for problem in problems:
+            print(f"{state_file}: {problem}")
+        if not problems:
+            print(f"{state_file}: valid state with {len(state['resources'])} resources")
+        failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
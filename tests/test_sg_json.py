@@ -0,0 +1,58 @@
+import json
+import random
+
+import pytest
+
+from sg_json import iter_json_array
+
+CHUNK_SIZES = (1, 2, 3, 5, 8, 64)
+
+def write_json(tmp_path, text):
+    path = tmp_path / "document.json"
+    path.write_text(text)
+    return str(path)
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_scalar_items_cut_at_a_chunk_boundary(tmp_path, chunk_size):
+    items = [97513, -1.5e-7, 0, 'ab\\"c]', True, None, [1, [22, 333]], {"k": 12345}]
+    path = write_json(tmp_path, json.dumps({"items": items}))
+    assert list(iter_json_array(path, "items", chunk_size)) == items
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_only_the_top_level_key_matches(tmp_path, chunk_size):
+    # Like a state file whose outputs come before its resources
+    document = {
+        "outputs": {"resources": {"value": ["output"]}, "text": {"value": '"resources": ["string"] \\" ]['}},
+        "nested": [{"resources": ["nested"]}],
+        "resources": [{"name": "a"}, {"name": "b"}],
+    }
+    path = write_json(tmp_path, json.dumps(document, indent=2))
+    assert list(iter_json_array(path, "resources", chunk_size)) == document["resources"]
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_missing_key_yields_nothing(tmp_path, chunk_size):
+    path = write_json(tmp_path, json.dumps({"other": [1, 2], "text": "items"}))
+    assert list(iter_json_array(path, "items", chunk_size)) == []
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(7 if depth < 3 else 4)
+    if kind == 0:
+        return rng.choice([0, -7, 97513, 10 ** 12, 3.25, -1e-9, 6.02e23])
+    if kind == 1:
+        return "".join(rng.choice('ab ,:[]{}"\\\\é') for _ in range(rng.randrange(6)))
+    if kind == 2:
+        return rng.choice([True, False])
+    if kind == 3:
+        return None
+    if kind == 4:
+        return [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+    return {f"k{n}": random_value(rng, depth + 1) for n in range(rng.randrange(4))}
+
+def test_matches_json_loads_on_random_documents(tmp_path):
+    rng = random.Random(0)
+    for _ in range(200):
+        items = [random_value(rng) for _ in range(rng.randrange(6))]
+        document = {"before": random_value(rng), "items": items, "after": random_value(rng)}
+        path = write_json(tmp_path, json.dumps(document, indent=rng.choice([None, 1])))
+        for chunk_size in CHUNK_SIZES:
+            assert list(iter_json_array(path, "items", chunk_size)) == json.loads(open(path).read())["items"]
@@ -0,0 +1,57 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from sg_render import INGRESS_RULE_TYPE, render_import_call, render_import_script
+
+pytestmark = pytest.mark.skipif(shutil.which("sh") is None or shutil.which("xargs") is None,
+                                reason="needs a POSIX shell and xargs")
+
+# Records every import and fails the one whose ID is in $FAIL_ID
+FAKE_TERRAFORM = """#!/bin/sh
+for id; do :; done
+echo "$id" >> "$IMPORT_LOG"
+[ "$id" != "${FAIL_ID:-}" ]
+"""
+
+def run_script(directory, script, fail_id=""):
+    script_file = os.path.join(directory, "import.sh")
+    with open(script_file, "w") as file:
+        file.write(script)
+    env = dict(os.environ, PATH=f"{directory}{os.pathsep}{os.environ['PATH']}", FAIL_ID=fail_id,
+               IMPORT_LOG=os.path.join(directory, "imports.log"), JOBS="2")
+    return subprocess.run(["sh", script_file], cwd=directory, env=env, capture_output=True, text=True)
+
+def imported(directory):
+    with open(os.path.join(directory, "imports.log")) as file:
+        return file.read().split()
+
+@pytest.fixture
+def directory(tmp_path):
+    terraform = tmp_path / "terraform"
+    terraform.write_text(FAKE_TERRAFORM)
+    terraform.chmod(0o755)
+    (tmp_path / "imports.log").write_text("")
+    return str(tmp_path)
+
+def test_failed_imports_are_retried_on_the_next_run(directory):
+    batches = {
+        "web": [render_import_call(INGRESS_RULE_TYPE, f"web-ingress{n}", f"sgr-{n}") for n in (1, 2)],
+        "db": [render_import_call(INGRESS_RULE_TYPE, "db-ingress1", "sgr-3")],
+    }
+    script = render_import_script(batches)
+
+    first = run_script(directory, script, fail_id="sgr-2")
+    assert first.returncode == 1
+    assert sorted(imported(directory)) == ["sgr-1", "sgr-2", "sgr-3"]
+
+    second = run_script(directory, script)
+    assert second.returncode == 0
+    assert sorted(imported(directory)) == ["sgr-1", "sgr-2", "sgr-2", "sgr-3"]
+
+def test_script_without_imports_succeeds(directory):
+    result = run_script(directory, render_import_script({}))
+    assert result.returncode == 0, result.stderr
+    assert imported(directory) == []
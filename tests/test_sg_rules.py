@@ -0,0 +1,16 @@
+from sg_rules import claim_rule
+
+def test_rows_of_a_bucket_claim_its_rules_in_order():
+    claimed, cursors = set(), {}
+    bucket = ("sgr-1", "sgr-2", "sgr-3")
+    assert [claim_rule(bucket, claimed, cursors) for _ in range(4)] == ["sgr-1", "sgr-2", "sgr-3", None]
+    assert claim_rule((), claimed, cursors) is None
+
+def test_rules_claimed_through_another_bucket_are_skipped():
+    claimed, cursors = set(), {}
+    wildcard = ("sgr-1", "sgr-2", "sgr-3")
+    exact = ("sgr-2", "sgr-3")
+    assert claim_rule(exact, claimed, cursors) == "sgr-2"
+    assert claim_rule(wildcard, claimed, cursors) == "sgr-1"
+    assert claim_rule(wildcard, claimed, cursors) == "sgr-3"
+    assert claim_rule(exact, claimed, cursors) is None
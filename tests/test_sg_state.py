@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+import sg_rules
+from sg_state import check_groups_csv
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+def test_groups_csv_with_every_column_passes(tmp_path):
+    check_groups_csv(write(tmp_path / "groups.csv", "GroupId,GroupName,VpcId,Description,Tags,OwnerId\n"))
+
+def test_missing_groups_csv_columns_are_named(tmp_path):
+    groups_csv = write(tmp_path / "groups.csv", "GroupName,VpcId,Tags\nweb,vpc-1,\n")
+    with pytest.raises(ValueError, match="has no GroupId, Description columns"):
+        check_groups_csv(groups_csv)
+
+def test_missing_groups_csv_column_fails_before_any_output(tmp_path):
+    groups_csv = write(tmp_path / "groups.csv", "GroupName,VpcId,Description,Tags\nweb,vpc-1,Web,\n")
+    rules_csv = write(tmp_path / "rules.csv", "GroupId,GroupName\n")
+    rules_json = write(tmp_path / "rules.json", '{"SecurityGroupRules": []}')
+    output_file = str(tmp_path / "rules.txt")
+    with pytest.raises(ValueError, match="has no GroupId column"):
+        sg_rules.generate_terraform_and_imports(
+            rules_csv, rules_json, output_file, str(tmp_path / "imports.bat"),
+            tfstate_file=str(tmp_path / "terraform.tfstate"), groups_csv=groups_csv
+        )
+    assert not os.path.exists(output_file)